@@ -0,0 +1,217 @@
+import argparse
+import datetime
+import gzip
+import heapq
+import itertools
+import os
+import socket
+
+from organizeMediaFiles import compute_hash_value, get_file_digest, order_for_reading, scan_folder
+
+MANIFEST_HEADER = "# fileorganizer-manifest v1"
+
+def escape_field(value):
+
+    """ Escapes backslashes, tabs and newlines so a path always fits in a single tab-separated field. """
+
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def unescape_field(value):
+
+    """ Reverses escape_field. """
+
+    result = []
+    characters = iter(value)
+    for character in characters:
+        if character == "\\":
+            character = {"t": "\t", "n": "\n"}.get(next(characters, ""), "\\")
+        result.append(character)
+    return "".join(result)
+
+def open_manifest(path, mode):
+
+    """ Opens a manifest as text, compressing it with gzip when its name ends with '.gz'. """
+
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def export_manifest(root_folder, manifest_path, node):
+
+    """ Writes a manifest of every file under the root folder, with one 'digest, size, date, relative path' line per file, sorted by digest. """
+
+    records = []
+
+    # Recursively traverses the root folder and its subdirectories
+    # Hashes the files in the order their data lies on disk where that is enabled
+    for record in order_for_reading(scan_folder(root_folder)):
+        date = datetime.datetime.fromtimestamp(record.mtime).strftime("%Y:%m:%d %H:%M:%S")
+        records.append((get_file_digest(record.path), record.size, date, os.path.relpath(record.path, root_folder)))
+
+    # Sorting by digest lets any number of manifests be merged in a single linear pass
+    records.sort()
+
+    with open_manifest(manifest_path, "w") as f:
+        f.write(f"{MANIFEST_HEADER} node={escape_field(node)}\n")
+        for digest, size, date, relative_path in records:
+            f.write(f"{digest}\t{size}\t{date}\t{escape_field(relative_path)}\n")
+
+    print(f"Exported {len(records)} file(s) from {root_folder} to {manifest_path}.\n")
+
+def parse_manifest_header(header, manifest_path):
+
+    """ Returns the node named in the header line of a manifest, or the manifest path if it names none. """
+
+    header = header.rstrip("\n")
+    if not header.startswith(MANIFEST_HEADER):
+        raise ValueError(f"{manifest_path} is not a file organizer manifest")
+    return unescape_field(header.split(" node=", 1)[1]) if " node=" in header else manifest_path
+
+def read_manifest_node(manifest_path):
+
+    """ Returns the node a manifest was exported from, reading only its header. """
+
+    with open_manifest(manifest_path, "r") as f:
+        return parse_manifest_header(f.readline(), manifest_path)
+
+def read_manifest(manifest_path):
+
+    """ Streams the records of a manifest as (digest, size, node, date, relative path) tuples. """
+
+    with open_manifest(manifest_path, "r") as f:
+        node = parse_manifest_header(f.readline(), manifest_path)
+
+        for line in f:
+            digest, size, date, relative_path = line.rstrip("\n").split("\t", 3)
+            yield digest, int(size), node, date, unescape_field(relative_path)
+
+def merge_manifests(manifest_paths, output_path):
+
+    """
+
+    Merges digest-sorted manifests with a k-way merge and writes every group of files sharing a digest across or within nodes.
+
+    Within a group, the first copy found on the earliest listed manifest is kept and every other copy is marked for deletion. Each 
+    manifest must come from a different node, as the groups are applied by node name.
+
+    """
+
+    # Refuses manifests given twice or sharing a node name, which would let 'apply' delete every copy of a file
+    nodes = {}
+    real_paths = set()
+    for manifest_path in manifest_paths:
+        real_path = os.path.realpath(manifest_path)
+        if real_path in real_paths:
+            print(f"Error: {manifest_path} was given more than once.")
+            return
+        real_paths.add(real_path)
+
+        node = read_manifest_node(manifest_path)
+        if node in nodes:
+            print(f"Error: {manifest_path} and {nodes[node]} were both exported as node '{node}'. "
+                  "Export them again with a different --node for each machine.")
+            return
+        nodes[node] = manifest_path
+
+    # Ranks nodes by the order their manifests were given, so the keeper is deterministic
+    streams = []
+    for rank, manifest_path in enumerate(manifest_paths):
+        records = read_manifest(manifest_path)
+        streams.append((digest, rank, relative_path, size, node, date) for digest, size, node, date, relative_path in records)
+
+    groups_found = 0
+    redundant_files = 0
+    redundant_bytes = 0
+
+    with open_manifest(output_path, "w") as f:
+        for digest, group in itertools.groupby(heapq.merge(*streams, key=lambda record: record[:2]), key=lambda record: record[0]):
+            group = list(group)
+            if len(group) < 2:
+                continue
+
+            groups_found += 1
+            for position, (_, _, relative_path, size, node, date) in enumerate(group):
+                action = "keep" if position == 0 else "delete"
+                if action == "delete":
+                    redundant_files += 1
+                    redundant_bytes += size
+                f.write(f"{digest}\t{size}\t{escape_field(node)}\t{action}\t{date}\t{escape_field(relative_path)}\n")
+
+    print(f"Found {groups_found} duplicate group(s) across {len(manifest_paths)} manifest(s): "
+          f"{redundant_files} redundant file(s), {redundant_bytes} bytes reclaimable.\n")
+
+def apply_duplicate_groups(groups_path, root_folder, node):
+
+    """ Deletes this node's redundant copies listed in a merged duplicate groups file, using only local I/O. """
+
+    to_delete = []
+    kept_paths = set()
+    with open_manifest(groups_path, "r") as f:
+        for line in f:
+            digest, size, group_node, action, _, relative_path = line.rstrip("\n").split("\t", 5)
+            if unescape_field(group_node) != node:
+                continue
+            file_path = os.path.join(root_folder, unescape_field(relative_path))
+            if action == "delete":
+                to_delete.append((digest, int(size), file_path))
+            else:
+                kept_paths.add(file_path)
+
+    # Never deletes a file that is also the kept copy of its group, as happens when two machines share a node name
+    to_delete = [(digest, size, file_path) for digest, size, file_path in to_delete if file_path not in kept_paths]
+
+    if not to_delete:
+        print(f"No redundant files were listed for node '{node}'.\n")
+        return
+
+    user_input = input(f"{len(to_delete)} redundant file(s) are listed for node '{node}'. Would you like to delete them? (Yes/No):\n").strip().lower()
+    if user_input != "yes":
+        print("No files were deleted.\n")
+        return
+
+    for digest, size, file_path in to_delete:
+        # Checks the local copy still matches the manifest before deleting it
+        if os.path.exists(file_path) is False or os.path.getsize(file_path) != size or compute_hash_value(file_path) != digest:
+            print(f"Skipped {file_path}, it no longer matches the manifest.\n")
+            continue
+        os.remove(file_path)
+        print(f"{file_path} has been deleted.\n")
+
+def main():
+    # Parses command-line arguments
+    parser = argparse.ArgumentParser(
+        description="Export digest manifests and find duplicates across machines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export", help="write a digest-sorted manifest of a local folder")
+    export_parser.add_argument("root_folder")
+    export_parser.add_argument("manifest", help="output file, gzip-compressed if it ends with '.gz'")
+    export_parser.add_argument(
+        "--node", default=socket.gethostname(),
+        help="name recorded for this machine. Default is the host name.")
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="merge manifests and write the duplicate groups found across them")
+    merge_parser.add_argument("manifests", nargs="+", help="manifests in order of preference for the kept copy")
+    merge_parser.add_argument("-o", "--output", required=True, help="duplicate groups file")
+
+    apply_parser = subparsers.add_parser(
+        "apply", help="delete this machine's redundant copies listed in a duplicate groups file")
+    apply_parser.add_argument("groups")
+    apply_parser.add_argument("root_folder")
+    apply_parser.add_argument(
+        "--node", default=socket.gethostname(),
+        help="name this machine was exported under. Default is the host name.")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_manifest(args.root_folder, args.manifest, args.node)
+    elif args.command == "merge":
+        merge_manifests(args.manifests, args.output)
+    elif args.command == "apply":
+        apply_duplicate_groups(args.groups, args.root_folder, args.node)
+
+if __name__ == "__main__":
+    main()
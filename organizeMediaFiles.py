@@ -1,15 +1,1189 @@
 import argparse
+import concurrent.futures
+import collections
+import ctypes
 import os
+import platform
 import subprocess
+import sys
 import shutil
 import datetime
+import errno
 import filetype
+import fnmatch
 import hashlib
+import json
+import math
+import mmap
+import queue
 import re
+import select
+import sqlite3
+import struct
+import threading
+import time
+
+# Number of bytes read from the start of a file to compute its partial hash
+PARTIAL_HASH_SIZE = 64 * 1024
+
+# Size of the buffer used to copy and hash files in a single pass
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Size of the chunks read when hashing files, and the buffer alignment required by O_DIRECT reads
+READ_CHUNK_SIZE = 1024 * 1024
+DIRECT_IO_ALIGNMENT = 4096
+
+# Set from the command line to read file content with O_DIRECT, bypassing the page cache entirely
+use_direct_io = False
+
+# Order in which batches of files are read: 'walk', 'inode', 'extent', or 'auto' to read in extent order on rotational disks only
+read_order = "auto"
+read_order_by_device = {}
+
+# FIEMAP ioctl request, used to find where the first extent of a file lies on disk
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQIIII")
+FIEMAP_EXTENT = struct.Struct("=QQQQQIIII")
+
+# Token buckets shared by every thread reading file content, set from the command line to throttle reads
+read_bandwidth_limiter = None
+read_operations_limiter = None
+
+# Number of bytes read to detect the type of a file from its header
+HEADER_SIZE = 8192
+
+# ioprio_set system call numbers and constants, used to lower the I/O priority of background runs on Linux
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_SHIFT = 13
+BACKGROUND_NICENESS = 10
+
+# Cache of digests and extracted metadata, set from the command line
+METADATA_CACHE_NAME = "metadata_cache.sqlite3"
+XATTR_PREFIX = "user.fileorganizer."
+METADATA_FIELDS = ("algorithm", "digest", "createdate", "extension", "duration", "partialhash")
+# Number of cache writes committed to the database together
+METADATA_CACHE_BATCH_SIZE = 1000
+metadata_cache = None
+
+# Folder created under the target directory to persist the library index between runs
+STATE_FOLDER = ".fileorganizer"
+LIBRARY_INDEX_NAME = "library.sqlite3"
+LIBRARY_FILTER_NAME = "library_filter.npz"
+
+# Manifest of the duplicate groups written next to the staged duplicates
+DUPLICATES_MANIFEST_NAME = "duplicates.json"
+
+# Folder under the target directory that deleted files are moved to in trash mode
+TRASH_FOLDER = ".trash"
+# Folder of a trash run mirroring the absolute paths of trashed files from outside the trash root
+TRASH_EXTERNAL_FOLDER = "external"
+
+# Folder where bursts of similar photos are linked for review, and the manifest written there
+BURSTS_FOLDER = "Bursts"
+BURSTS_MANIFEST_NAME = "bursts.json"
+
+# Photo extensions considered for burst detection, and the tags holding their capture time, most precise first
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".heic", ".heif", ".tif", ".tiff", ".webp")
+CAPTURE_TIME_TAGS = ("SubSecDateTimeOriginal", "SubSecCreateDate", "DateTimeOriginal", "CreateDate")
+
+# Extensions of the videos that accompany live photos, their maximum duration in seconds and the tags holding their capture time
+LIVE_PHOTO_VIDEO_EXTENSIONS = (".mov", ".mp4")
+LIVE_PHOTO_MAX_DURATION = 5
+VIDEO_CAPTURE_TIME_TAGS = ("CreationDate", "CreateDate")
+
+# Number of files passed to a single exiftool process when reading metadata in batches
+EXIFTOOL_BATCH_SIZE = 500
+
+# Default number of files removed concurrently in the background
+DELETE_WORKERS = 4
+
+# Number of folders listed concurrently, set from the command line for high-latency network filesystems
+scan_workers = 1
+
+# Maximum number of scanned files waiting to be consumed when folders are listed in parallel
+SCAN_QUEUE_SIZE = 10000
+
+# Folders directly under the target directory that scans never descend into
+SKIPPED_FOLDERS = (STATE_FOLDER, TRASH_FOLDER, BURSTS_FOLDER)
+
+# Folders of other tools that scans never descend into unless told otherwise, such as Synology thumbnails and version control
+DEFAULT_PRUNED_FOLDERS = ("@eaDir", "#recycle", "#snapshot", ".git", ".svn", ".Trashes", ".Spotlight-V100", ".fseventsd")
+
+# Name patterns of the folders scans do not descend into and of the files they include or exclude, set from the command line
+pruned_folder_patterns = DEFAULT_PRUNED_FOLDERS
+included_file_patterns = ()
+excluded_file_patterns = ()
+
+# Month folders created by the month format
+MONTH_FOLDERS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Catalog of folder listings reused by incremental scans, set from the command line
+SCAN_CATALOG_NAME = "scan_catalog.sqlite3"
+scan_catalog = None
+
+# inotify event flags used by watch mode, and how long a file must stay unchanged before it is organized
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_SETTLE_SECONDS = 2.0
+
+# Number of folder file descriptors kept open to move files relative to their folders
+DIRECTORY_HANDLES_SIZE = 64
+
+# Folders modified this close to being listed are not cataloged, as a later change could leave their modification time unchanged
+SCAN_CATALOG_RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+class FileRecord:
+
+    """ 
+    
+    File found while scanning a folder or reading a file list. Its type comes from the directory listing and its stat result is 
+    fetched once, on first use. A size and modification time given by a file list are used without calling stat at all.
+
+    """
+
+    __slots__ = ("path", "name", "entry", "stat_result", "listed_size", "listed_mtime")
+
+    def __init__(self, path, entry=None, listed_size=None, listed_mtime=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.entry = entry
+        self.stat_result = None
+        self.listed_size = listed_size
+        self.listed_mtime = listed_mtime
+
+    @property
+    def folder_path(self):
+        return os.path.dirname(self.path)
+
+    def stat(self):
+        if self.stat_result is None:
+            self.stat_result = self.entry.stat() if self.entry is not None else os.stat(self.path)
+        return self.stat_result
+
+    @property
+    def size(self):
+        return self.listed_size if self.listed_size is not None else self.stat().st_size
+
+    @property
+    def mtime(self):
+        return self.listed_mtime if self.listed_mtime is not None else self.stat().st_mtime
+
+class ScanCatalog:
+
+    """ 
+    
+    Remembers the files and subfolders of every folder listed, along with the folder's inode and modification time.
+
+    Adding, removing or renaming an entry updates the modification time of its folder, so a folder whose time has not moved can be 
+    answered from the catalog without listing it. The catalog is kept in memory during a run and saved under the state folder.
+
+    """
+
+    def __init__(self, root_folder):
+        state_path = os.path.join(root_folder, STATE_FOLDER)
+        os.makedirs(state_path, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(state_path, SCAN_CATALOG_NAME), check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, inode INTEGER, mtime_ns INTEGER, "
+                                "files TEXT, subfolders TEXT)")
+        self.folders = {}
+        for path, inode, mtime_ns, files, subfolders in self.connection.execute("SELECT path, inode, mtime_ns, files, subfolders FROM folders"):
+            self.folders[path] = (inode, mtime_ns, json.loads(files), json.loads(subfolders))
+        self.changed_paths = set()
+        self.lock = threading.Lock()
+
+    def get(self, folder_path, stat_result):
+
+        """ Returns the file and subfolder names of a folder that has not changed since it was cataloged, or None. """
+
+        with self.lock:
+            folder = self.folders.get(os.path.abspath(folder_path))
+        if folder is None or folder[0] != stat_result.st_ino or folder[1] != stat_result.st_mtime_ns:
+            return None
+        return folder[2], folder[3]
+
+    def record(self, folder_path, stat_result, listed_ns, file_names, subfolder_names):
+
+        """ Catalogs the complete listing of a folder, taken at listed_ns. """
+
+        folder_path = os.path.abspath(folder_path)
+        with self.lock:
+            previous = self.folders.pop(folder_path, None)
+            # Forgets subfolders that are gone, so the catalog does not grow with every folder ever seen
+            if previous is not None:
+                for subfolder_name in set(previous[3]) - set(subfolder_names):
+                    if self.folders.pop(os.path.join(folder_path, subfolder_name), None) is not None:
+                        self.changed_paths.add(os.path.join(folder_path, subfolder_name))
+
+            if stat_result.st_mtime_ns < listed_ns - SCAN_CATALOG_RACY_WINDOW_NS:
+                self.folders[folder_path] = (stat_result.st_ino, stat_result.st_mtime_ns, file_names, subfolder_names)
+            self.changed_paths.add(folder_path)
+
+    def save(self):
+
+        """ Writes the folders cataloged or forgotten since the last save. """
+
+        with self.lock:
+            for folder_path in self.changed_paths:
+                folder = self.folders.get(folder_path)
+                if folder is None:
+                    self.connection.execute("DELETE FROM folders WHERE path = ?", (folder_path,))
+                else:
+                    inode, mtime_ns, file_names, subfolder_names = folder
+                    self.connection.execute("INSERT OR REPLACE INTO folders (path, inode, mtime_ns, files, subfolders) VALUES (?, ?, ?, ?, ?)",
+                                            (folder_path, inode, mtime_ns, json.dumps(file_names), json.dumps(subfolder_names)))
+            self.connection.commit()
+            self.changed_paths.clear()
+
+class DirectoryHandles:
+
+    """ 
+
+    Keeps the most recently used folders open, so files are looked up, created, moved and removed relative to a folder file 
+    descriptor instead of the kernel resolving every component of a long path each time.
+
+    A folder removed while it is open makes operations on it fail, and those are retried once with the folder opened again. A name 
+    missing from a folder that is still there is an ordinary miss and is not retried. Platforms without dir_fd support use plain paths.
+
+    """
+
+    def __init__(self, max_open=DIRECTORY_HANDLES_SIZE):
+        self.max_open = max_open
+        self.handles = collections.OrderedDict()
+        self.supported = hasattr(os, "O_DIRECTORY") and {os.stat, os.mkdir, os.rename, os.unlink} <= os.supports_dir_fd
+
+    def get(self, folder_path):
+
+        """ Returns an open file descriptor of a folder, closing the least recently used one when too many are open. """
+
+        folder_path = os.path.abspath(folder_path)
+        if folder_path in self.handles:
+            self.handles.move_to_end(folder_path)
+            return self.handles[folder_path]
+
+        fd = os.open(folder_path, os.O_RDONLY | os.O_DIRECTORY | getattr(os, "O_CLOEXEC", 0))
+        self.handles[folder_path] = fd
+        if len(self.handles) > self.max_open:
+            os.close(self.handles.popitem(last=False)[1])
+        return fd
+
+    def is_stale(self, folder_path):
+
+        """ Checks whether an open folder has been removed since it was opened, which leaves it without any links. """
+
+        fd = self.handles.get(os.path.abspath(folder_path))
+        if fd is None:
+            return False
+        try:
+            return os.fstat(fd).st_nlink == 0
+        except OSError:
+            return True
+
+    def forget(self, folder_path):
+        fd = self.handles.pop(os.path.abspath(folder_path), None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self):
+
+        """ Closes every open folder, for instance before folders may be removed. """
+
+        while self.handles:
+            os.close(self.handles.popitem()[1])
+
+    def _call(self, operation, *paths):
+        # Calls operation with the folder file descriptor and name of each path, opening the folders again if one has gone away
+        split_paths = [os.path.split(os.path.abspath(path)) for path in paths]
+        try:
+            return operation(*[(self.get(folder_path), name) for folder_path, name in split_paths])
+        except FileNotFoundError:
+            stale_folders = [folder_path for folder_path, _ in split_paths if self.is_stale(folder_path)]
+            if not stale_folders:
+                raise
+            for folder_path in stale_folders:
+                self.forget(folder_path)
+            return operation(*[(self.get(folder_path), name) for folder_path, name in split_paths])
+
+    def exists(self, path):
+        if not self.supported:
+            return os.path.exists(path)
+        try:
+            self._call(lambda target: os.stat(target[1], dir_fd=target[0]), path)
+            return True
+        except OSError:
+            return False
+
+    def makedirs(self, folder_path):
+        if not self.supported:
+            os.makedirs(folder_path, exist_ok=True)
+            return
+        parent_path = os.path.dirname(os.path.abspath(folder_path))
+        if parent_path != os.path.abspath(folder_path) and not self.exists(parent_path):
+            self.makedirs(parent_path)
+        try:
+            self._call(lambda target: os.mkdir(target[1], dir_fd=target[0]), folder_path)
+        except FileExistsError:
+            pass
+
+    def rename(self, source_path, destination_path):
+        if not self.supported:
+            os.rename(source_path, destination_path)
+            return
+        self._call(lambda source, destination: os.rename(source[1], destination[1], src_dir_fd=source[0], dst_dir_fd=destination[0]),
+                   source_path, destination_path)
+
+    def unlink(self, path):
+        if not self.supported:
+            os.remove(path)
+            return
+        self._call(lambda target: os.unlink(target[1], dir_fd=target[0]), path)
+
+# Folders kept open by the thread that organizes files
+directory_handles = DirectoryHandles()
+
+def configure_scanning(workers=1, catalog_root=None, prune=DEFAULT_PRUNED_FOLDERS, include=(), exclude=()):
+
+    """ 
+    
+    Sets the number of folders listed concurrently by every scan and, with a catalog root, turns on incremental scans.
+
+    Scans do not descend into folders whose name matches a prune pattern. Files are skipped when their name matches an exclude 
+    pattern or, if include patterns are given, none of them.
+
+    """
+
+    global scan_workers, scan_catalog, pruned_folder_patterns, included_file_patterns, excluded_file_patterns
+    scan_workers = max(1, workers)
+    scan_catalog = ScanCatalog(catalog_root) if catalog_root is not None else None
+    pruned_folder_patterns = tuple(prune)
+    included_file_patterns = tuple(pattern.lower() for pattern in include)
+    excluded_file_patterns = tuple(pattern.lower() for pattern in exclude)
+
+def is_program_folder(folder_path, root_folder):
+
+    """ Checks whether a folder is one this program creates directly under the root folder, such as the trash or burst review. """
+
+    return (os.path.basename(folder_path) in SKIPPED_FOLDERS and root_folder is not None
+            and os.path.abspath(os.path.dirname(folder_path)) == os.path.abspath(root_folder))
+
+def is_pruned_folder(folder_path, root_folder=None):
+
+    """ Checks whether scans skip a folder, either one used by this program under the root folder or one matching a prune pattern. """
+
+    folder_name = os.path.basename(folder_path)
+    return is_program_folder(folder_path, root_folder) or any(fnmatch.fnmatchcase(folder_name, pattern) for pattern in pruned_folder_patterns)
+
+def is_scanned_file(file_name):
+
+    """ Checks a file name against the include and exclude patterns, ignoring case as file extensions vary in case. """
+
+    file_name = file_name.lower()
+    if included_file_patterns and not any(fnmatch.fnmatchcase(file_name, pattern) for pattern in included_file_patterns):
+        return False
+    return not any(fnmatch.fnmatchcase(file_name, pattern) for pattern in excluded_file_patterns)
+
+def list_folder(folder_path, add_subfolder, root_folder=None):
+
+    """ 
+
+    Yields a FileRecord for every file of a single folder and passes the path of each subfolder to add_subfolder.
+
+    With incremental scans, a folder that has not changed since it was last listed is answered from the scan catalog instead. The 
+    catalog keeps every entry, so that the prune, include and exclude patterns can change between runs.
+
+    """
+
+    stat_result = None
+    if scan_catalog is not None:
+        try:
+            stat_result = os.stat(folder_path)
+        except OSError:
+            return
+        cached = scan_catalog.get(folder_path, stat_result)
+        if cached is not None:
+            file_names, subfolder_names = cached
+            for subfolder_name in subfolder_names:
+                subfolder_path = os.path.join(folder_path, subfolder_name)
+                if not is_pruned_folder(subfolder_path, root_folder):
+                    add_subfolder(subfolder_path)
+            for file_name in file_names:
+                if is_scanned_file(file_name):
+                    yield FileRecord(os.path.join(folder_path, file_name))
+            return
+
+    # Only keeps the names of a folder when they are cataloged, so huge folders are still streamed otherwise
+    listed_ns = time.time_ns()
+    file_names = [] if scan_catalog is not None else None
+    subfolder_names = [] if scan_catalog is not None else None
+    try:
+        iterator = os.scandir(folder_path)
+    except OSError:
+        return
+
+    with iterator:
+        for entry in iterator:
+            try:
+                # Uses the file type returned by the listing, so no stat call is needed to tell files and folders apart
+                if entry.is_dir(follow_symlinks=False):
+                    if subfolder_names is not None:
+                        subfolder_names.append(entry.name)
+                    if not is_pruned_folder(entry.path, root_folder):
+                        add_subfolder(entry.path)
+                elif entry.is_file():
+                    if file_names is not None:
+                        file_names.append(entry.name)
+                    if is_scanned_file(entry.name):
+                        yield FileRecord(entry.path, entry)
+            except OSError:
+                continue
+
+    if scan_catalog is not None:
+        scan_catalog.record(folder_path, stat_result, listed_ns, file_names, subfolder_names)
+
+def scan_folder(root_folder):
+
+    """ 
+    
+    Streams a FileRecord for every regular file under the root folder, without descending into the folders used for the library 
+    index, the trash and burst review, or into pruned folders.
+
+    Each folder is read with os.scandir and its files are yielded while it is being listed, so huge folders are never held in memory. 
+    Only the paths of the folders still to visit are kept, in the same top-down order as os.walk. When more than one scan worker is 
+    configured, folders are listed in parallel instead and the same records are yielded in no particular order.
+
+    """
+
+    try:
+        if scan_workers > 1:
+            yield from scan_folder_parallel(root_folder, scan_workers)
+            return
+
+        pending = [root_folder]
+        while pending:
+            subfolders = []
+            yield from list_folder(pending.pop(), subfolders.append, root_folder)
+            pending.extend(reversed(subfolders))
+    finally:
+        if scan_catalog is not None:
+            scan_catalog.save()
+
+def parse_file_list_entry(entry):
+
+    """ Parses a file list entry, which is either a path or a size, a modification time and a path separated by tabs. """
+
+    columns = entry.split(b"\t", 2)
+    if len(columns) == 3:
+        try:
+            return FileRecord(os.fsdecode(columns[2]), listed_size=int(columns[0]), listed_mtime=float(columns[1]))
+        except ValueError:
+            pass
+    return FileRecord(os.fsdecode(entry))
+
+def is_in_pruned_folder(file_path, root_folder=None):
+
+    """ Checks whether any folder on the path of a file is skipped by scans of the root folder. """
+
+    folder_path = os.path.dirname(os.path.normpath(file_path))
+    while folder_path and folder_path != os.path.dirname(folder_path):
+        if is_pruned_folder(folder_path, root_folder):
+            return True
+        folder_path = os.path.dirname(folder_path)
+    return False
+
+def read_file_list(list_path, root_folder=None):
+
+    """ 
+
+    Streams a FileRecord for every file of a list, read from standard input when list_path is '-', instead of scanning folders.
+
+    Entries are separated by NUL characters, as written by 'find -print0', or else by newlines. Each entry is a path, optionally 
+    preceded by a size and a modification time in seconds, as written by "find -printf '%s\\t%T@\\t%p\\0'". Entries are yielded as soon 
+    as they are read, and the prune, include and exclude patterns apply to them as they do to scans of the root folder.
+
+    """
+
+    # Reads the standard input the process was started with, as questions may be read from the terminal instead
+    stream = sys.__stdin__.buffer if list_path == "-" else open(list_path, "rb")
+    separator = None
+    buffer = b""
+    try:
+        while True:
+            chunk = stream.read1(64 * 1024) if hasattr(stream, "read1") else stream.read(64 * 1024)
+            buffer += chunk
+            if separator is None and (b"\0" in buffer or b"\n" in buffer or not chunk):
+                # A list holding any NUL character is NUL-separated, as NUL cannot appear in a path
+                separator = b"\0" if b"\0" in buffer else b"\n"
+
+            if separator is not None:
+                entries = buffer.split(separator)
+                buffer = entries.pop() if chunk else b""
+                for entry in entries:
+                    entry = entry.rstrip(b"\r") if separator == b"\n" else entry
+                    if not entry:
+                        continue
+                    record = parse_file_list_entry(entry)
+                    if is_scanned_file(record.name) and not is_in_pruned_folder(record.path, root_folder):
+                        yield record
+            if not chunk:
+                break
+    finally:
+        if stream is not sys.__stdin__.buffer:
+            stream.close()
+
+def scan_folder_parallel(root_folder, workers):
+
+    """ 
+
+    Streams the same records as scan_folder, listing up to workers folders at a time so that slow round trips to a network 
+    filesystem overlap.
+
+    Every worker keeps its own queue of folders, taking the most recently found one so it stays deep in its own subtree. An idle 
+    worker steals the oldest folder from another worker's queue, which is the one most likely to hold a large subtree.
+
+    """
+
+    folder_queues = [collections.deque() for _ in range(workers)]
+    folder_queues[0].append(root_folder)
+    condition = threading.Condition()
+    # Number of folders queued or being listed, so workers know when the whole tree has been listed
+    unfinished_folders = [1]
+    records = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    stopped = threading.Event()
+
+    def take_folder(index):
+        with condition:
+            while not stopped.is_set():
+                if folder_queues[index]:
+                    return folder_queues[index].pop()
+                for other_queue in folder_queues:
+                    if other_queue:
+                        return other_queue.popleft()
+                if unfinished_folders[0] == 0:
+                    return None
+                condition.wait()
+            return None
+
+    def put_record(record):
+        # Waits for the consumer to catch up, unless it has stopped reading
+        while not stopped.is_set():
+            try:
+                records.put(record, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def list_folders(index):
+        def add_subfolder(subfolder_path):
+            # Publishes subfolders as soon as they are found so idle workers can start on them
+            with condition:
+                folder_queues[index].append(subfolder_path)
+                unfinished_folders[0] += 1
+                condition.notify()
+
+        try:
+            while (folder_path := take_folder(index)) is not None:
+                for record in list_folder(folder_path, add_subfolder, root_folder):
+                    put_record(record)
+                    if stopped.is_set():
+                        break
+
+                with condition:
+                    unfinished_folders[0] -= 1
+                    if unfinished_folders[0] == 0:
+                        condition.notify_all()
+        finally:
+            put_record(None)
+
+    threads = [threading.Thread(target=list_folders, args=(index,), daemon=True) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        finished_workers = 0
+        while finished_workers < workers:
+            record = records.get()
+            if record is None:
+                finished_workers += 1
+            else:
+                yield record
+    finally:
+        # Lets the workers exit when the consumer stops early
+        stopped.set()
+        with condition:
+            condition.notify_all()
+
+class TokenBucket:
+
+    """ Thread-safe token bucket that lets work through at a steady rate, with bursts of up to one second's worth of tokens. """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount=1):
+
+        """ Takes tokens from the bucket, sleeping as long as needed to stay within the rate. """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Lets the bucket go into debt so requests larger than a burst still pass, after waiting for their share
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+def configure_reads(direct_io=False, max_read_mbps=None, max_iops=None, order="auto"):
+
+    """ 
+    
+    Sets whether file content is read with O_DIRECT where supported, the bandwidth and operation limits shared by all reads, and the 
+    order in which batches of files are read.
+
+    """
+
+    global use_direct_io, read_bandwidth_limiter, read_operations_limiter, read_order
+    use_direct_io = direct_io
+    read_order = order
+    read_order_by_device.clear()
+    read_bandwidth_limiter = TokenBucket(max_read_mbps * 1000 * 1000) if max_read_mbps else None
+    read_operations_limiter = TokenBucket(max_iops) if max_iops else None
+
+def throttle_read():
+
+    """ Waits until the shared read limits allow another read operation. Called once before every read. """
+
+    if read_operations_limiter is not None:
+        read_operations_limiter.consume(1)
+
+def account_read_bytes(num_bytes):
+
+    """ Charges the bytes returned by a read to the shared bandwidth limit. """
+
+    if read_bandwidth_limiter is not None and num_bytes > 0:
+        read_bandwidth_limiter.consume(num_bytes)
+
+def apply_background_priority():
+
+    """ Lowers the CPU and I/O priority of the process. Child processes such as exiftool inherit both. """
+
+    os.nice(BACKGROUND_NICENESS)
+
+    syscall_number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if platform.system() != "Linux" or syscall_number is None:
+        print("Lowering the I/O priority is only supported on Linux, only the CPU priority was lowered.")
+        return
+
+    # Uses the lowest best-effort priority rather than the idle class, which can starve the run completely on a busy disk
+    libc = ctypes.CDLL(None, use_errno=True)
+    priority = (IOPRIO_CLASS_BE << IOPRIO_CLASS_SHIFT) | 7
+    if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, priority) != 0:
+        print("Could not lower the I/O priority:", os.strerror(ctypes.get_errno()))
+
+def advise_file(fd, advice_name):
+
+    """ Gives the kernel a posix_fadvise hint about a whole file, on platforms that support it. """
+
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice_name))
+        except OSError:
+            pass
+
+def is_rotational_device(device):
+
+    """ Checks from sysfs whether a device is a spinning disk, looking at the whole disk for partitions. Platforms without sysfs report no spinning disks. """
+
+    if not hasattr(os, "major") or not os.path.isdir("/sys/dev/block"):
+        return False
+    block_path = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    for queue_path in (os.path.join(block_path, "queue", "rotational"), os.path.join(block_path, "..", "queue", "rotational")):
+        try:
+            with open(queue_path) as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return False
+
+def get_device_read_order(device):
+
+    """ Returns the read order used for files of a device, resolving 'auto' once per device. """
+
+    if read_order != "auto":
+        return read_order
+    if device not in read_order_by_device:
+        read_order_by_device[device] = "extent" if is_rotational_device(device) else "walk"
+    return read_order_by_device[device]
+
+def get_first_extent_offset(file_path):
+
+    """ Returns the physical offset of the first extent of a file from the FIEMAP ioctl, or None where it is not available. """
+
+    try:
+        import fcntl
+    except ImportError:
+        return None
+
+    request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, request, True)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+    mapped_extents = FIEMAP_HEADER.unpack_from(request)[3]
+    if mapped_extents == 0:
+        return None
+    return FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)[1]
+
+def order_for_reading(files):
+
+    """ 
+
+    Orders a batch of files by where their data lies on disk, so a rotational disk reads them in one sweep instead of seeking back 
+    and forth. Files are kept in walk order on devices read in walk order, which is the default for solid-state and network storage.
+
+    In extent order, files are sorted by the physical offset of their first extent, falling back to their inode number, which most 
+    filesystems allocate close to the data, when FIEMAP is not supported.
+
+    Accepts paths or FileRecords and returns them in the new order. A file's device is taken from its folder, which is stat'ed once 
+    for all its files, and inode numbers come from the directory listing, so files are not stat'ed one by one.
+
+    """
+
+    files = list(files)
+    if read_order == "walk":
+        return files
+
+    folder_devices = {}
+    keys = []
+    for position, item in enumerate(files):
+        record = item if isinstance(item, FileRecord) else None
+        file_path = item.path if record is not None else item
+        try:
+            if record is not None and record.stat_result is not None:
+                device = record.stat_result.st_dev
+            else:
+                folder_path = os.path.dirname(file_path) or "."
+                if folder_path not in folder_devices:
+                    folder_devices[folder_path] = os.stat(folder_path).st_dev
+                device = folder_devices[folder_path]
+        except OSError:
+            keys.append((0, 0, position))
+            continue
+
+        device_order = get_device_read_order(device)
+        if device_order == "walk":
+            keys.append((device, 0, position))
+            continue
+        offset = get_first_extent_offset(file_path) if device_order == "extent" else None
+        if offset is not None:
+            keys.append((device, 1, offset))
+            continue
+
+        # Only files without a directory entry, such as those read from a list, need a stat call for their inode number
+        try:
+            if record is not None and record.entry is not None:
+                inode = record.entry.inode()
+            else:
+                inode = record.stat().st_ino if record is not None else os.stat(file_path).st_ino
+        except OSError:
+            inode = 0
+        keys.append((device, 2, inode))
+
+    order = sorted(range(len(files)), key=keys.__getitem__)
+    return [files[index] for index in order]
+
+def benchmark_read_order(root_folder):
+
+    """ Times reading the start of every file under the root folder in walk order and in the configured read order. """
+
+    file_paths = [record.path for record in scan_folder(root_folder)]
+    for name, ordered_paths in (("Walk order", file_paths), (f"'{read_order}' order", order_for_reading(file_paths))):
+        # Drops the files from the page cache first, so both passes read from the disk
+        for file_path in file_paths:
+            try:
+                with open(file_path, "rb") as f:
+                    advise_file(f.fileno(), "POSIX_FADV_DONTNEED")
+            except OSError:
+                pass
+
+        started = time.monotonic()
+        for file_path in ordered_paths:
+            try:
+                compute_partial_hash(file_path)
+            except OSError:
+                pass
+        print(f"{name}: read {len(file_paths)} file(s) in {time.monotonic() - started:.2f} seconds.")
+
+def _read_direct_chunks(fd, chunk_size, limit):
+    # Anonymous memory maps are page aligned, as O_DIRECT requires for the buffer, offset and length
+    aligned_size = -(-chunk_size // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT
+    with mmap.mmap(-1, aligned_size) as buffer:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            throttle_read()
+            num_read = os.readv(fd, [buffer])
+            account_read_bytes(num_read)
+            if num_read == 0:
+                break
+            chunk = buffer[:num_read if remaining is None else min(num_read, remaining)]
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+            if num_read < aligned_size:
+                break
+
+def read_file_chunks(file_path, chunk_size=READ_CHUNK_SIZE, limit=None, drop_cache=True):
+
+    """ 
+    
+    Yields the content of a file in chunks, up to limit bytes if given, without poisoning the page cache.
+
+    The kernel is told the file will be read sequentially, so it reads ahead aggressively, and the file's pages are dropped from the 
+    cache once it has been read. With O_DIRECT enabled, the content bypasses the cache altogether when the filesystem allows it.
+
+    Short reads whose pages are about to be read again, such as file headers, pass drop_cache=False to leave the cache untouched.
+
+    """
+
+    fd = None
+    if drop_cache and use_direct_io and getattr(os, "O_DIRECT", 0):
+        try:
+            fd = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+        except OSError:
+            # Some filesystems, such as tmpfs, do not support O_DIRECT
+            fd = None
+
+    if fd is not None:
+        try:
+            yield from _read_direct_chunks(fd, chunk_size, limit)
+        finally:
+            os.close(fd)
+        return
+
+    with open(file_path, 'rb', buffering=0) as f:
+        if drop_cache:
+            advise_file(f.fileno(), "POSIX_FADV_SEQUENTIAL")
+        try:
+            remaining = limit
+            while remaining is None or remaining > 0:
+                throttle_read()
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                account_read_bytes(len(chunk))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            if drop_cache:
+                advise_file(f.fileno(), "POSIX_FADV_DONTNEED")
+
+class MetadataCache:
+
+    """ 
+    
+    Caches file digests and extracted metadata, valid for as long as a file keeps the same size and modification time.
+
+    Values are kept in a database under the state folder. With xattrs enabled, they are stored in 'user.fileorganizer.*' extended 
+    attributes of each file instead, so they follow the file when it is moved and can be read by other tools with a single system 
+    call. Files on filesystems without xattr support silently fall back to the database.
+
+    Database writes are committed in batches of METADATA_CACHE_BATCH_SIZE, so flush() must be called once the run is done.
+
+    """
+
+    def __init__(self, root_folder, use_xattrs=False):
+        state_path = os.path.join(root_folder, STATE_FOLDER)
+        os.makedirs(state_path, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(state_path, METADATA_CACHE_NAME), check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                                + ", ".join(f"{name} TEXT" for name in METADATA_FIELDS) + ")")
+
+        # Adds the columns of fields introduced after the cache was created
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(metadata)")}
+        for name in METADATA_FIELDS:
+            if name not in columns:
+                self.connection.execute(f"ALTER TABLE metadata ADD COLUMN {name} TEXT")
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.use_xattrs = use_xattrs and hasattr(os, "setxattr")
+        self.unsupported_devices = set()
+
+    def _xattrs_usable(self, stat_result):
+        return self.use_xattrs and stat_result.st_dev not in self.unsupported_devices
+
+    def _xattr_failed(self, error, stat_result):
+        # Remembers filesystems without xattr support so they are not asked again
+        if error.errno in (errno.ENOTSUP, errno.EOPNOTSUPP):
+            self.unsupported_devices.add(stat_result.st_dev)
+
+    def _written(self):
+        # Commits once enough writes have piled up, and is called with the lock held
+        self.pending_writes += 1
+        if self.pending_writes >= METADATA_CACHE_BATCH_SIZE:
+            self.connection.commit()
+            self.pending_writes = 0
+
+    def get(self, file_path, stat_result=None):
+
+        """ Returns the cached values of a file as a dictionary, which is empty if nothing valid is cached. A known stat result spares a stat call. """
+
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        values = None
+
+        if self._xattrs_usable(stat_result):
+            try:
+                names = [name for name in os.listxattr(file_path) if name.startswith(XATTR_PREFIX)]
+                if names:
+                    values = {name[len(XATTR_PREFIX):]: os.getxattr(file_path, name).decode() for name in names}
+            except OSError as e:
+                self._xattr_failed(e, stat_result)
+
+        if values is None:
+            with self.lock:
+                row = self.connection.execute("SELECT size, mtime_ns, " + ", ".join(METADATA_FIELDS) + " FROM metadata WHERE path = ?",
+                                              (os.path.abspath(file_path),)).fetchone()
+            if row is None:
+                return {}
+            values = {"size": str(row[0]), "mtime_ns": str(row[1])}
+            values.update({name: value for name, value in zip(METADATA_FIELDS, row[2:]) if value is not None})
+
+        # Ignores values cached before the file was last modified
+        if values.get("size") != str(stat_result.st_size) or values.get("mtime_ns") != str(stat_result.st_mtime_ns):
+            return {}
+        return values
+
+    def update(self, file_path, stat_result=None, **new_values):
+
+        """ 
+        
+        Caches values for a file, such as digest='...' or createdate='...', alongside its current size and modification time.
+
+        A stat result taken before the values were computed can be passed in, so a file modified meanwhile is not cached as valid.
+
+        """
+
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        values = self.get(file_path, stat_result)
+        values.update(new_values)
+        values["size"] = str(stat_result.st_size)
+        values["mtime_ns"] = str(stat_result.st_mtime_ns)
+
+        if self._xattrs_usable(stat_result):
+            try:
+                for name, value in values.items():
+                    os.setxattr(file_path, XATTR_PREFIX + name, value.encode())
+                # Clears values left over from before the file was modified, which the new size and time would otherwise validate
+                for name in METADATA_FIELDS:
+                    if name not in values and XATTR_PREFIX + name in os.listxattr(file_path):
+                        os.removexattr(file_path, XATTR_PREFIX + name)
+                return
+            except OSError as e:
+                self._xattr_failed(e, stat_result)
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO metadata (path, size, mtime_ns, " + ", ".join(METADATA_FIELDS) + ") "
+                                    "VALUES (?, ?, ?" + ", ?" * len(METADATA_FIELDS) + ")",
+                                    (os.path.abspath(file_path), stat_result.st_size, stat_result.st_mtime_ns,
+                                     *(values.get(name) for name in METADATA_FIELDS)))
+            self._written()
+
+    def rename(self, old_path, new_path):
+
+        """ Keeps the cached values of a file that has been moved. Values stored in xattrs move with the file by themselves. """
+
+        with self.lock:
+            self.connection.execute("UPDATE OR REPLACE metadata SET path = ? WHERE path = ?", (os.path.abspath(new_path), os.path.abspath(old_path)))
+            self._written()
+
+    def flush(self):
+
+        """ Commits the writes of the current batch to the database. """
+
+        with self.lock:
+            if self.pending_writes:
+                self.connection.commit()
+                self.pending_writes = 0
+
+def configure_metadata_cache(root_folder, use_xattrs=False):
+
+    """ Enables the cache of digests and extracted metadata for the rest of the run. """
+
+    global metadata_cache
+    metadata_cache = MetadataCache(root_folder, use_xattrs)
+
+def read_file_header(file_path, size=HEADER_SIZE):
+
+    """ Reads the first bytes of a file through the shared read path, for file type detection. """
+
+    # Keeps the header cached, since exiftool or the copy reads the same pages right after
+    return b"".join(read_file_chunks(file_path, size, limit=size, drop_cache=False))
+
+def format_size(num_bytes):
+
+    """ Formats a number of bytes for display, such as '1.5 GB'. """
+
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if num_bytes < 1024 or unit == "GB":
+            break
+        num_bytes /= 1024
+    return f"{num_bytes:.0f} {unit}" if unit == "bytes" else f"{num_bytes:.1f} {unit}"
+
+
+class DeletionExecutor:
+
+    """ 
+    
+    Deletes files for every cleanup stage and reports the space reclaimed.
+
+    In trash mode, files are renamed into '.trash/<run id>/' under the trash root, which is instant and can be undone by moving them 
+    back. Files from outside the trash root, such as an ingest source, are kept under their absolute path in the run's 'external' 
+    folder, and a file trashed where another one already lies gets a numbered suffix instead of replacing it. Otherwise files are 
+    removed in the background by a bounded pool of worker threads.
+
+    """
+
+    def __init__(self, trash_root=None, max_workers=DELETE_WORKERS):
+        self.trash_root = trash_root
+        self.trash_path = None
+        if trash_root:
+            run_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+            self.trash_path = os.path.join(trash_root, TRASH_FOLDER, run_id)
+
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        # Bounds the number of queued removals so huge deletions do not pile up in memory
+        self.slots = threading.BoundedSemaphore(4 * max_workers)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.scheduled = set()
+        self.files_deleted = 0
+        self.files_trashed = 0
+        self.bytes_trashed = 0
+        self.bytes_reclaimed = 0
+        self.errors = 0
+
+    def is_scheduled(self, file_path):
+        return os.path.normpath(file_path) in self.scheduled
+
+    def delete(self, file_path):
+
+        """ Deletes a file, or moves it to the trash in trash mode. Files already scheduled for deletion are ignored. """
+
+        normalized_path = os.path.normpath(file_path)
+        if normalized_path in self.scheduled:
+            return
+        self.scheduled.add(normalized_path)
+
+        if self.trash_path and self._move_to_trash(file_path):
+            return
+
+        self.slots.acquire()
+        future = self.pool.submit(self._remove, file_path)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def _move_to_trash(self, file_path):
+        # Keeps the folder structure relative to the trash root, or the absolute path of other files, so files can be restored
+        absolute_path = os.path.abspath(file_path)
+        try:
+            relative_path = os.path.relpath(absolute_path, os.path.abspath(self.trash_root))
+        except ValueError:
+            # Files on another Windows drive have no path relative to the trash root
+            relative_path = os.pardir
+        if relative_path.startswith(os.pardir):
+            drive, path = os.path.splitdrive(absolute_path)
+            relative_path = os.path.join(TRASH_EXTERNAL_FOLDER, drive.replace(":", ""), path.lstrip(os.sep))
+        trashed_path = os.path.join(self.trash_path, relative_path)
+
+        # Never replaces a file trashed earlier under the same path, for instance by a long-running watch
+        stem, extension = os.path.splitext(trashed_path)
+        suffix = 0
+        while os.path.lexists(trashed_path):
+            suffix += 1
+            trashed_path = f"{stem}_{suffix}{extension}"
+
+        try:
+            size = os.lstat(file_path).st_size
+            os.makedirs(os.path.dirname(trashed_path), exist_ok=True)
+            os.rename(file_path, trashed_path)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                print(f"{file_path} is on another device than the trash and will be deleted permanently.")
+                return False
+            print(f"Error moving {file_path} to the trash: {e}")
+            self.errors += 1
+            return True
+
+        self.files_trashed += 1
+        self.bytes_trashed += size
+        return True
+
+    def _remove(self, file_path):
+        try:
+            size = os.lstat(file_path).st_size
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Error deleting {file_path}: {e}")
+            with self.lock:
+                self.errors += 1
+            return
+
+        with self.lock:
+            self.files_deleted += 1
+            self.bytes_reclaimed += size
+
+    def wait(self):
+
+        """ Waits until every scheduled removal has finished. """
+
+        concurrent.futures.wait(self.futures)
+        self.futures = []
+
+    def close(self, print_summary=True):
+
+        """ Waits for pending removals, shuts the worker pool down and prints a summary. """
+
+        self.wait()
+        self.pool.shutdown()
+        if not print_summary:
+            return
+
+        if self.files_trashed:
+            print(f"{self.files_trashed} file(s) have been moved to {self.trash_path}. Empty it to reclaim {format_size(self.bytes_trashed)}.\n")
+        if self.files_deleted:
+            print(f"{self.files_deleted} file(s) have been deleted, reclaiming {format_size(self.bytes_reclaimed)}.\n")
+        if self.errors:
+            print(f"{self.errors} file(s) could not be deleted.\n")
 
 def is_media_file(file):
-    if os.path.exists(file):
-        file_type = filetype.guess(file)
+    try:
+        file_type = filetype.guess(read_file_header(file))
+    except OSError:
+        return False
+    else:
 
         # Defines a tuple of media file extensions
         media_extensions = ("jpg", "jpeg", "png", "gif", "bmp",
@@ -21,10 +1195,34 @@ def is_media_file(file):
             return True
         return False
 
+def pack_exif_result(create_date, file_extension, print_output = True):
+
+    """ Returns the creation date and file extension in the shape returned by get_exif_create_date_and_extension. """
+
+    # Checks if both creation date and file extension exist
+    if create_date and file_extension:
+        return create_date, file_extension
+    elif create_date and not file_extension:
+        return create_date
+    elif file_extension and not create_date:
+        return file_extension
+    else:
+        if print_output:
+            print("No EXIF metadata exists")
+        return None
+
 def get_exif_create_date_and_extension(filepath, print_output = True):
 
     """ Extracts the creation date of a file using exiftool. """
 
+    # Reuses the values extracted by an earlier run while the file is unchanged
+    stat_result = None
+    if metadata_cache is not None:
+        stat_result = os.stat(filepath)
+        cached = metadata_cache.get(filepath, stat_result)
+        if "createdate" in cached:
+            return pack_exif_result(cached["createdate"], cached.get("extension"), print_output)
+
     try:
         result = subprocess.run(['exiftool', '-CreateDate', '-mimetype', filepath], capture_output=True, text=True)
         if result.returncode == 0:
@@ -45,17 +1243,9 @@ def get_exif_create_date_and_extension(filepath, print_output = True):
                         if file_extension == "quicktime":
                             file_extension = "mov"
                 
-                # Checks if both creation date and file extension exist
-                if create_date and file_extension:
-                    return create_date, file_extension
-                elif create_date and not file_extension:
-                    return create_date
-                elif file_extension and not create_date:
-                    return file_extension
-                else:
-                    if print_output:
-                        print("No EXIF metadata exists")
-                    return None
+                if metadata_cache is not None:
+                    metadata_cache.update(filepath, stat_result, createdate=create_date or "", extension=file_extension or "")
+                return pack_exif_result(create_date, file_extension, print_output)
             else:
                 if print_output:
                     print("No output received from exiftool")
@@ -95,7 +1285,13 @@ def delete_empty_folders(root, created_folders):
 
     # Iterates over directories in the root directory
     for dirpath, dirnames, filenames in os.walk(root, topdown=False):
-        excepted_folders = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "Uncategorized"]
+        # Leaves the inside of the folders used by the program alone, as a bottom-up walk cannot prune them
+        if os.path.relpath(dirpath, root).split(os.sep)[0] in SKIPPED_FOLDERS:
+            continue
+        excepted_folders = [*MONTH_FOLDERS, "Uncategorized"]
+        # The folders used by the program itself only live directly under the root
+        if os.path.abspath(dirpath) == os.path.abspath(root):
+            excepted_folders.extend(SKIPPED_FOLDERS)
 
         # Regular expression pattern to match four-digit numbers (years)
         year_pattern = re.compile(r'^\d{4}$')
@@ -123,9 +1319,16 @@ def delete_empty_folders(root, created_folders):
                 except Exception as e:
                     print(f"An error occurred while trying to delete the folder: {e}")
 
-def categorize_files(file, args, created_folders):
+def categorize_files(file, args, created_folders, moved_files=None, deleter=None):
+
+    """ 
+    
+    Categorizes the file into folders based on its creation year, or moves it to an 'Uncategorized' folder if creation date metadata is not available.
+
+    An incoming file identical to the one already at its final path is removed through the deleter when one is given, so trash mode 
+    and the space reclaimed summary apply to it.
 
-    """ Categorizes the file into folders based on its creation year, or moves it to an 'Uncategorized' folder if creation date metadata is not available. """
+    """
 
     format  = args.format
 
@@ -167,22 +1370,168 @@ def categorize_files(file, args, created_folders):
         directory_name = "/".join([args.target,"Uncategorized"])
         final_path = os.path.join(directory_name,file.split("/")[-1])
 
-    if os.path.exists(directory_name) is False:
+    if directory_handles.exists(directory_name) is False:
         # Creates the directory if it doesn't exist and update created_folders set
-        os.makedirs(directory_name, exist_ok=True)
+        directory_handles.makedirs(directory_name)
         components = directory_name.split("/")
         for component in components:
             created_folders.add(component)
         print("Folder " + directory_name + " created.")
 
-    if os.path.exists(final_path) is False:
+    # Resolves name collisions by content, so identical files are dealt with before the duplicate search
+    final_path = resolve_name_collision(file, final_path)
+
+    if directory_handles.exists(final_path) is False:
          # Moves the file to the final path or skips if it already exists
         print("Moving " + file + " to " + final_path)
-        os.rename(file, final_path)
-    else:
+        file_digest = None
+        if args.source:
+            file_digest = ingest_file(file, final_path, args.verify)
+            if file_digest is None:
+                return created_folders
+        else:
+            try:
+                directory_handles.rename(file, final_path)
+                if metadata_cache is not None:
+                    metadata_cache.rename(file, final_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Falls back to copying when the file lives on another device
+                file_digest = ingest_file(file, final_path, args.verify)
+                if file_digest is None:
+                    return created_folders
+        if moved_files is not None:
+            moved_files[final_path] = file_digest
+    elif os.path.samefile(file, final_path):
         print("Skipped " + file + ", already exists in " + directory_name)
+    else:
+        if deleter is not None:
+            deleter.delete(file)
+        else:
+            directory_handles.unlink(file)
+        print(f"{file} is identical to {final_path} and has been deleted.\n")
     return created_folders
 
+def files_are_identical(first_path, second_path):
+
+    """ Compares the content of two files, reading as little as possible by checking their size, then partial hash, then full hash. """
+
+    if os.path.getsize(first_path) != os.path.getsize(second_path):
+        return False
+    if compute_partial_hash(first_path) != compute_partial_hash(second_path):
+        return False
+    if os.path.getsize(first_path) <= PARTIAL_HASH_SIZE:
+        return True
+    return get_file_digest(first_path) == get_file_digest(second_path)
+
+def resolve_name_collision(file, final_path):
+
+    """ 
+    
+    Returns the path a file should be moved to when its final path may already be taken.
+
+    Occupied paths holding identical content are returned as is, so the caller can drop the incoming copy. Otherwise the file 
+    gets the first free name with a numbered suffix, such as 'IMG_0001_1.JPG', which is the same on every run over the same tree.
+
+    """
+
+    stem, extension = os.path.splitext(final_path)
+    candidate = final_path
+    suffix = 0
+
+    while directory_handles.exists(candidate):
+        if files_are_identical(file, candidate):
+            return candidate
+        suffix += 1
+        candidate = f"{stem}_{suffix}{extension}"
+    return candidate
+
+def fsync_folder(folder_path):
+
+    """ Flushes a folder's entries to disk, so a file renamed into it survives a power loss. Does nothing where folders cannot be opened. """
+
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(folder_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def copy_and_hash_file(source_path, destination_path, verify=False):
+
+    """ 
+    
+    Copies a file and computes its MD5 hash value from the same buffer, so its content is only read once.
+
+    The copy is written to a temporary file, flushed to disk and then renamed into place. If verify is set, the destination is 
+    read back and compared with the digest of the source. Returns the digest of the file.
+
+    """
+
+    md5Hash = hashlib.md5()
+    temporary_path = os.path.join(os.path.dirname(destination_path), "." + os.path.basename(destination_path) + ".part")
+
+    try:
+        with open(temporary_path, 'wb') as destination:
+            for chunk in read_file_chunks(source_path, COPY_CHUNK_SIZE):
+                md5Hash.update(chunk)
+                destination.write(chunk)
+            destination.flush()
+            os.fsync(destination.fileno())
+            # The copy is not read again unless it is verified, so its pages are released once on disk
+            advise_file(destination.fileno(), "POSIX_FADV_DONTNEED")
+        shutil.copystat(source_path, temporary_path)
+
+        if verify and compute_hash_value(temporary_path) != md5Hash.hexdigest():
+            raise OSError(f"Verification of the copy of {source_path} failed")
+
+        # Commits the copy only once its content is on disk, and makes the rename itself durable before the source can be deleted
+        os.replace(temporary_path, destination_path)
+        fsync_folder(os.path.dirname(os.path.abspath(destination_path)))
+        if metadata_cache is not None:
+            metadata_cache.update(destination_path, algorithm="md5", digest=md5Hash.hexdigest())
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    return md5Hash.hexdigest()
+
+def ingest_file(source_path, destination_path, verify=False):
+
+    """ Copies a file into the library while hashing it, and deletes the source only after the copy has been committed. Returns the digest, or None if the copy failed. """
+
+    try:
+        file_digest = copy_and_hash_file(source_path, destination_path, verify)
+    except OSError as e:
+        print(f"Error copying {source_path}: {e}")
+        return None
+
+    # The copy is committed, so a source that cannot be removed, such as a write-protected memory card, is only reported
+    try:
+        os.remove(source_path)
+    except OSError as e:
+        print(f"Could not delete {source_path} after copying it, the source was kept: {e}")
+    return file_digest
+
+def get_file_digest(file_path):
+
+    """ Returns the MD5 hash value of a file, from the metadata cache when it holds a valid one. """
+
+    stat_result = None
+    if metadata_cache is not None:
+        stat_result = os.stat(file_path)
+        cached = metadata_cache.get(file_path, stat_result)
+        if cached.get("algorithm") == "md5" and cached.get("digest"):
+            return cached["digest"]
+
+    file_hash = compute_hash_value(file_path)
+    if metadata_cache is not None:
+        metadata_cache.update(file_path, stat_result, algorithm="md5", digest=file_hash)
+    return file_hash
+
 def compute_hash_value(file_path):
 
     """ 
@@ -219,18 +1568,119 @@ def compute_hash_value(file_path):
     # Creates an MD5 hash object
     md5Hash = hashlib.md5()
 
-     # Opens the file in binary mode
-    with open(file_path, 'rb') as f:
-        # Iterate over the file in chunks of 4096 bytes
-        for chunk in iter(lambda: f.read(4096), b""):
-            # Updates the MD5 hash object with the data from the current chunk
-            md5Hash.update(chunk)
+    # Iterates over the file in chunks, keeping the page cache free for other workloads
+    for chunk in read_file_chunks(file_path):
+        # Updates the MD5 hash object with the data from the current chunk
+        md5Hash.update(chunk)
 
     # Returns the hexadecimal representation of the hash value
     return md5Hash.hexdigest()
 
 
-def find_duplicate_files(root_folder):
+def compute_partial_hash(file_path):
+
+    """ Computes a 64-bit partial hash from the first PARTIAL_HASH_SIZE bytes of a file. """
+
+    head = b"".join(read_file_chunks(file_path, PARTIAL_HASH_SIZE, limit=PARTIAL_HASH_SIZE))
+
+    # Keeps only the first 8 bytes of the MD5 digest so the value fits in an unsigned 64-bit integer
+    return int.from_bytes(hashlib.md5(head).digest()[:8], "big")
+
+def get_partial_hash(file_path):
+
+    """ Returns the partial hash of a file, from the metadata cache when it holds a valid one. """
+
+    stat_result = None
+    if metadata_cache is not None:
+        stat_result = os.stat(file_path)
+        cached = metadata_cache.get(file_path, stat_result)
+        if cached.get("partialhash"):
+            return int(cached["partialhash"])
+
+    partial_hash = compute_partial_hash(file_path)
+    if metadata_cache is not None:
+        metadata_cache.update(file_path, stat_result, partialhash=str(partial_hash))
+    return partial_hash
+
+
+class FileCatalog:
+
+    """ Keeps the paths of a folder's files alongside NumPy arrays of their sizes and 64-bit partial hashes. """
+
+    def __init__(self, paths, sizes, partial_hashes):
+        self.paths = paths
+        self.sizes = sizes
+        self.partial_hashes = partial_hashes
+
+    def candidate_groups(self):
+
+        """ Returns arrays of indices of files sharing both size and partial hash, in traversal order. """
+
+        if len(self.paths) < 2:
+            return []
+
+        import numpy as np
+
+        # Sorts by size first and partial hash second in a single pass
+        order = np.lexsort((self.partial_hashes, self.sizes))
+        sorted_sizes = self.sizes[order]
+        sorted_partial_hashes = self.partial_hashes[order]
+
+        # Finds the positions where either key changes, which are the group boundaries
+        changes = (np.diff(sorted_sizes) != 0) | (np.diff(sorted_partial_hashes) != 0)
+        starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+        ends = np.append(starts[1:], len(order))
+
+        groups = []
+        for start, end in zip(starts, ends):
+            if end - start > 1:
+                groups.append(np.sort(order[start:end]))
+        return groups
+
+
+def catalog_files(file_paths, hash_all=False, file_sizes=None):
+
+    """ 
+    
+    Builds a FileCatalog of the given files, computing partial hashes only for files whose size is not unique unless hash_all is set.
+
+    Sizes already known from a scan can be passed in file_sizes so the files are not stat'ed again.
+
+    """
+
+    import numpy as np
+
+    paths = list(file_paths)
+    if file_sizes is None:
+        file_sizes = [os.path.getsize(file_path) for file_path in paths]
+    sizes = np.array(file_sizes, dtype=np.uint64)
+    partial_hashes = np.zeros(len(paths), dtype=np.uint64)
+
+    if hash_all:
+        indices = range(len(paths))
+    elif len(paths) > 1:
+        # Files with a unique size cannot have duplicates, so their content is never read
+        _, inverse, counts = np.unique(sizes, return_inverse=True, return_counts=True)
+        indices = np.flatnonzero(counts[inverse] > 1)
+    else:
+        indices = []
+
+    index_by_path = {paths[index]: index for index in indices}
+    for file_path in order_for_reading(index_by_path):
+        partial_hashes[index_by_path[file_path]] = get_partial_hash(file_path)
+
+    return FileCatalog(paths, sizes, partial_hashes)
+
+
+def build_file_catalog(root_folder, hash_all=False):
+
+    """ Builds a FileCatalog of the files under the root folder. """
+
+    records = list(scan_folder(root_folder))
+    return catalog_files([record.path for record in records], hash_all, [record.size for record in records])
+
+
+def find_duplicate_files(root_folder, known_digests=None):
     
     """ 
 
@@ -239,21 +1689,268 @@ def find_duplicate_files(root_folder):
     This function has been adapted from the following project on GitHub that is under MIT license provided above: 
     https://github.com/MK-Ware/Duplicate-file-remover/tree/master 
 
+    Only files that share both size and partial hash are fully hashed, and only groups of two or more identical files are returned.
+    Digests already known, for example from an ingest copy, are reused instead of reading the file again.
+
     """
 
     dups = {}
-
-    # Recursively traverses the root folder and its subdirectories
-    for folder_path, _, file_names in os.walk(root_folder):
-        for file_name in file_names:
-            file_path = os.path.join(folder_path, file_name)
-            # Computes the hash value of the current file
-            file_hash = compute_hash_value(file_path)
+    known_digests = {os.path.normpath(file_path): file_hash for file_path, file_hash in (known_digests or {}).items()}
+    catalog = build_file_catalog(root_folder)
+    groups = catalog.candidate_groups()
+
+    # Computes the hash values in the order the files lie on disk, then groups them in traversal order
+    digests = {}
+    for file_path in order_for_reading(catalog.paths[index] for group in groups for index in group):
+        digests[file_path] = known_digests.get(os.path.normpath(file_path)) or get_file_digest(file_path)
+
+    for group in groups:
+        for index in group:
+            file_path = catalog.paths[index]
+            file_hash = digests[file_path]
             if file_hash in dups:
                 dups[file_hash].append(file_path)
             else:
                 dups[file_hash] = [file_path]
-    return dups
+
+    return {file_hash: file_paths for file_hash, file_paths in dups.items() if len(file_paths) > 1}
+
+class LibraryFilter:
+
+    """ Bloom filter over the (size, partial hash) keys of the files already in the organized library. """
+
+    def __init__(self, capacity, error_rate=0.01, bits=None, count=0):
+        self.capacity = max(int(capacity), 1024)
+        self.error_rate = error_rate
+        self.count = int(count)
+
+        # Sizes the bit array and the number of hash functions for the requested false positive rate
+        num_bits = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(num_bits / self.capacity * math.log(2)))
+        if bits is None:
+            import numpy as np
+            bits = np.zeros((num_bits + 7) // 8, dtype=np.uint8)
+        self.bits = bits
+        self.num_bits = len(bits) * 8
+
+    def _positions(self, size, partial_hash):
+        # Derives all bit positions from a single MD5 digest using double hashing
+        digest = hashlib.md5(int(size).to_bytes(8, "big") + int(partial_hash).to_bytes(8, "big")).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, size, partial_hash):
+        for position in self._positions(size, partial_hash):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, size, partial_hash):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(size, partial_hash))
+
+    def is_full(self):
+        return self.count > self.capacity
+
+    def save(self, path):
+        # Writes to a temporary file first so an interrupted run never leaves a truncated filter behind
+        import numpy as np
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f, bits=self.bits, capacity=self.capacity, count=self.count, error_rate=self.error_rate)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+        with np.load(path) as data:
+            return cls(int(data["capacity"]), float(data["error_rate"]), data["bits"].copy(), int(data["count"]))
+
+
+def open_library_index(root_folder):
+
+    """ Opens the digest index of the organized library, creating it under the state folder if needed. """
+
+    state_path = os.path.join(root_folder, STATE_FOLDER)
+    os.makedirs(state_path, exist_ok=True)
+
+    connection = sqlite3.connect(os.path.join(state_path, LIBRARY_INDEX_NAME))
+    connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, partial_hash TEXT, digest TEXT)")
+    connection.execute("CREATE INDEX IF NOT EXISTS files_by_key ON files (size, partial_hash)")
+    return connection
+
+
+def load_library_filter(root_folder):
+
+    """ Loads the persisted library filter, or returns None if the library has not been indexed yet. """
+
+    filter_path = os.path.join(root_folder, STATE_FOLDER, LIBRARY_FILTER_NAME)
+    if os.path.exists(filter_path) is False:
+        return None
+    try:
+        return LibraryFilter.load(filter_path)
+    except Exception as e:
+        print("Could not load the library filter, the library will be indexed again:", e)
+        return None
+
+
+def rebuild_library_filter(root_folder, connection, capacity=None):
+
+    """ Rebuilds the library filter from every entry of the digest index and saves it. """
+
+    rows = connection.execute("SELECT size, partial_hash FROM files").fetchall()
+    library_filter = LibraryFilter(capacity or 2 * len(rows))
+    for size, partial_hash in rows:
+        library_filter.add(size, int(partial_hash, 16))
+    library_filter.save(os.path.join(root_folder, STATE_FOLDER, LIBRARY_FILTER_NAME))
+    return library_filter
+
+
+def add_files_to_library_index(file_paths, root_folder, connection, library_filter, known_digests=None):
+
+    """ Records files in the digest index and the library filter, growing the filter when it reaches its capacity. """
+
+    known_digests = known_digests or {}
+    catalog = catalog_files([file_path for file_path in file_paths if os.path.exists(file_path)], hash_all=True)
+
+    for file_path, size, partial_hash in zip(catalog.paths, catalog.sizes, catalog.partial_hashes):
+        connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                           (os.path.relpath(file_path, root_folder), int(size), format(int(partial_hash), "016x"), known_digests.get(file_path)))
+        library_filter.add(size, partial_hash)
+    connection.commit()
+
+    if library_filter.is_full():
+        return rebuild_library_filter(root_folder, connection, 2 * library_filter.capacity)
+    library_filter.save(os.path.join(root_folder, STATE_FOLDER, LIBRARY_FILTER_NAME))
+    return library_filter
+
+
+def build_library_index(root_folder, connection, known_digests=None):
+
+    """ Indexes every file currently in the organized library and returns a fresh library filter. """
+
+    connection.execute("DELETE FROM files")
+    catalog = build_file_catalog(root_folder)
+    library_filter = LibraryFilter(2 * len(catalog.paths))
+    return add_files_to_library_index(catalog.paths, root_folder, connection, library_filter, known_digests)
+
+
+def find_duplicate_files_in_library(new_files, root_folder, connection, library_filter, known_digests=None):
+
+    """ 
+
+    Finds duplicates of newly organized files, both among themselves and against the organized library.
+
+    Files that the library filter rules out are never compared against the library. Filter hits are verified against the digest index, 
+    and library copies are listed first so they are the ones kept.
+
+    """
+
+    dups = {}
+    catalog = catalog_files([file_path for file_path in new_files if os.path.exists(file_path)], hash_all=True)
+    new_digests = {file_path: file_hash for file_path, file_hash in (known_digests or {}).items() if file_hash}
+
+    def new_file_digest(file_path):
+        if file_path not in new_digests:
+            new_digests[file_path] = get_file_digest(file_path)
+        return new_digests[file_path]
+
+    for file_path, size, partial_hash in zip(catalog.paths, catalog.sizes, catalog.partial_hashes):
+        if not library_filter.might_contain(size, partial_hash):
+            continue
+
+        rows = connection.execute("SELECT path, digest FROM files WHERE size = ? AND partial_hash = ?",
+                                  (int(size), format(int(partial_hash), "016x"))).fetchall()
+        for relative_path, library_digest in rows:
+            library_path = os.path.join(root_folder, relative_path)
+            if os.path.abspath(library_path) == os.path.abspath(file_path):
+                continue
+            # Drops index entries whose file has been removed since it was indexed
+            if os.path.exists(library_path) is False:
+                connection.execute("DELETE FROM files WHERE path = ?", (relative_path,))
+                continue
+            if library_digest is None:
+                library_digest = get_file_digest(library_path)
+                connection.execute("UPDATE files SET digest = ? WHERE path = ?", (library_digest, relative_path))
+
+            if library_digest == new_file_digest(file_path):
+                dups.setdefault(library_digest, [])
+                if library_path not in dups[library_digest]:
+                    dups[library_digest].append(library_path)
+    connection.commit()
+
+    # Groups the new files among themselves and with the library copies found above
+    for group in catalog.candidate_groups():
+        for index in group:
+            file_path = catalog.paths[index]
+            dups.setdefault(new_file_digest(file_path), []).append(file_path)
+    for file_path, file_hash in new_digests.items():
+        if file_hash in dups and file_path not in dups[file_hash]:
+            dups[file_hash].append(file_path)
+
+    return {file_hash: file_paths for file_hash, file_paths in dups.items() if len(file_paths) > 1}
+
+
+def is_in_organized_folder(file_path, root_folder):
+
+    """ Checks whether a file already sits in one of the year or 'Uncategorized' folders created under the root folder. """
+
+    relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(root_folder))
+    if relative_path.startswith(os.pardir):
+        return False
+    first_component = relative_path.split(os.sep)[0]
+    return first_component == "Uncategorized" or re.match(r'^\d{4}$', first_component) is not None
+
+def find_duplicates_before_organizing(source_folder, target_folder, connection=None, library_filter=None, file_records=None):
+
+    """ 
+    
+    Finds duplicates among the files about to be organized, and between them and the target, before any metadata is extracted.
+
+    Only the size and partial hash path is used to pick candidates. In every group, copies already inside the organized folders of 
+    the target come first so they are the ones kept. When the files to organize are given as records read from a list, the source 
+    is not scanned and only listed files are ever up for deletion.
+
+    """
+
+    source_records = list(file_records) if file_records is not None else list(scan_folder(source_folder))
+    source_files = [record.path for record in source_records]
+
+    def keep_priority(file_path):
+        if is_in_organized_folder(file_path, target_folder):
+            return 0
+        if os.path.abspath(file_path).startswith(os.path.abspath(target_folder) + os.sep):
+            return 1
+        return 2
+
+    if os.path.abspath(source_folder) != os.path.abspath(target_folder) and library_filter is not None:
+        # Library copies are already listed first by the library lookup
+        duplicates = find_duplicate_files_in_library(source_files, target_folder, connection, library_filter)
+    else:
+        if os.path.abspath(source_folder) == os.path.abspath(target_folder):
+            catalog = catalog_files(source_files, file_sizes=[record.size for record in source_records])
+        else:
+            records = list(scan_folder(target_folder)) + source_records
+            catalog = catalog_files([record.path for record in records], file_sizes=[record.size for record in records])
+
+        groups = catalog.candidate_groups()
+        digests = {file_path: get_file_digest(file_path) for file_path in order_for_reading(catalog.paths[index] for group in groups for index in group)}
+
+        dups = {}
+        for group in groups:
+            for index in group:
+                file_path = catalog.paths[index]
+                dups.setdefault(digests[file_path], []).append(file_path)
+        duplicates = {file_hash: sorted(file_paths, key=keep_priority) for file_hash, file_paths in dups.items() if len(file_paths) > 1}
+
+    if file_records is None:
+        return duplicates
+
+    # Leaves unlisted copies out of their groups, except for the one that is kept
+    listed_paths = set(source_files)
+    duplicates = {file_hash: file_paths[:1] + [file_path for file_path in file_paths[1:] if file_path in listed_paths]
+                  for file_hash, file_paths in duplicates.items()}
+    return {file_hash: file_paths for file_hash, file_paths in duplicates.items() if len(file_paths) > 1}
+
 
 def find_and_fix_file_extension_mismatches(root_folder):
     """Finds and fixes file extension mismatches within a given root folder."""
@@ -261,63 +1958,64 @@ def find_and_fix_file_extension_mismatches(root_folder):
     extension_mismatches_found = False
 
     # Recursively traverses the root folder and its subdirectories
-    for folder_path, _, file_names in os.walk(root_folder):
-        for file_name in file_names:
-            # Checks that the file does not have the ".aae" extension
-            if not file_name.lower().endswith(".aae"):
-                file_path = os.path.join(folder_path, file_name)
-                file_name_extension = file_name.strip().split(".")[1].upper()
-                if file_name_extension == "JPG":
-                    file_name_extension = "JPEG"
-
-                # Gets EXIF data including creation date and extension
-                exif_data = get_exif_create_date_and_extension(file_path, print_output = False)
-
-                if exif_data is not None:
-                    if isinstance(exif_data, tuple):
-                        _, file_exif_extension = exif_data
-                        
-                    elif isinstance(exif_data, str):
-                        if ":" not in exif_data:
-                            file_exif_extension = exif_data
+    for record in scan_folder(root_folder):
+        file_name = record.name
+        folder_path = record.folder_path
+        # Checks that the file does not have the ".aae" extension
+        if not file_name.lower().endswith(".aae"):
+            file_path = record.path
+            file_name_extension = file_name.strip().split(".")[1].upper()
+            if file_name_extension == "JPG":
+                file_name_extension = "JPEG"
+
+            # Gets EXIF data including creation date and extension
+            exif_data = get_exif_create_date_and_extension(file_path, print_output = False)
+
+            if exif_data is not None:
+                if isinstance(exif_data, tuple):
+                    _, file_exif_extension = exif_data
+                    
+                elif isinstance(exif_data, str):
+                    if ":" not in exif_data:
+                        file_exif_extension = exif_data
+                
+                # Compares file name extension with EXIF extension
+                if file_name_extension != file_exif_extension.upper():
+                    if not extension_mismatches_found:
+                        extension_mismatches_found = True
+                        # Asks user if they want to correct extension mismatches
+                        user_input = input("File(s) with extension mismatches have been identified. Would you like to correct them? (Yes/No): \n").strip().lower()
+                        if user_input == "no":
+                            print("No files were deleted.\n")
+                        elif user_input != "yes":
+                            print("Invalid input. No files were deleted.\n")
                     
-                    # Compares file name extension with EXIF extension
-                    if file_name_extension != file_exif_extension.upper():
-                        if not extension_mismatches_found:
-                            extension_mismatches_found = True
-                            # Asks user if they want to correct extension mismatches
-                            user_input = input("File(s) with extension mismatches have been identified. Would you like to correct them? (Yes/No): \n").strip().lower()
-                            if user_input == "no":
-                                print("No files were deleted.\n")
-                            elif user_input != "yes":
-                                print("Invalid input. No files were deleted.\n")
-                        
-                        # Generates the final path with corrected extension
-                        file_name_without_extension = os.path.splitext(file_name)[0]
-                        final_path = os.path.join(folder_path, file_name_without_extension) + "." + file_exif_extension.upper()
-                        try:
-                            # Renames the file
-                            os.rename(file_path, final_path)
-                            print(f"Renamed: {file_path} -> {final_path}\n")
-                        except Exception as e:
-                            print(f"Error renaming {file_path}: {e}")
+                    # Generates the final path with corrected extension
+                    file_name_without_extension = os.path.splitext(file_name)[0]
+                    final_path = os.path.join(folder_path, file_name_without_extension) + "." + file_exif_extension.upper()
+                    try:
+                        # Renames the file
+                        os.rename(file_path, final_path)
+                        print(f"Renamed: {file_path} -> {final_path}\n")
+                    except Exception as e:
+                        print(f"Error renaming {file_path}: {e}")
 
     if not extension_mismatches_found:
         print("No file(s) with extension mismatches were found.")
 
-def remove_aae_files(root_folder):
+def remove_aae_files(root_folder, deleter=None):
     """ Remove .aae files within a given root folder."""
 
     aae_files_found = False
+    owns_deleter = deleter is None
+    if owns_deleter:
+        deleter = DeletionExecutor()
 
     # Recursively traverses the root folder and its subdirectories
-    for folder_path, _, file_names in os.walk(root_folder):
-        for file_name in file_names:
-            # Checks if the file has the ".aae" extension
-            if file_name.lower().endswith(".aae"):
-                aae_files_found = True
-                break
-        if aae_files_found:
+    for record in scan_folder(root_folder):
+        # Checks if the file has the ".aae" extension
+        if record.name.lower().endswith(".aae"):
+            aae_files_found = True
             break
 
     if aae_files_found:
@@ -325,25 +2023,49 @@ def remove_aae_files(root_folder):
         user_input = input("AAE files have been found. Would you like to delete them? (Yes/No):\n").strip().lower()
         if user_input == "yes":
             # Recursively traverses the root folder and its subdirectories again
-            for folder_path, _, file_names in os.walk(root_folder):
-                for file_name in file_names:
-                    # Checks if the file has the ".aae" extension
-                    if file_name.lower().endswith(".aae"):
-                        file_path = os.path.join(folder_path, file_name)
-                        # Deletes the .aae file
-                        os.remove(file_path)
-                        print(f"{file_path} has been deleted.\n")
+            for record in scan_folder(root_folder):
+                # Checks if the file has the ".aae" extension
+                if record.name.lower().endswith(".aae"):
+                    # Deletes the .aae file
+                    deleter.delete(record.path)
         else:
             print("No AAE files have been deleted.\n")
     else:
         print("No AAE files found in the specified folder.\n")
+
+    if owns_deleter:
+        deleter.close()
+    else:
+        deleter.wait()
     
 
-def remove_duplicate_files(duplicates, root_folder):
+def stage_file_for_review(file_path, review_path):
+
+    """ Stages a file for review with a hardlink, or a symlink when the review folder is on another device, without copying any content. """
+
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    staged_path = os.path.join(review_path, stem + extension)
+    suffix = 0
+
+    # Keeps every staged file when duplicates from different folders share a name
+    while os.path.lexists(staged_path):
+        suffix += 1
+        staged_path = os.path.join(review_path, f"{stem}_{suffix}{extension}")
+
+    try:
+        os.link(file_path, staged_path)
+    except OSError:
+        os.symlink(os.path.abspath(file_path), staged_path)
+    return staged_path
+
+def remove_duplicate_files(duplicates, root_folder, deleter=None):
     """Removes duplicate files withi a given root folder."""
 
     show_duplicates = False
     duplicates_found = False
+    owns_deleter = deleter is None
+    if owns_deleter:
+        deleter = DeletionExecutor()
 
      # Checks if duplicates are found
     for file_paths in duplicates.values():
@@ -354,99 +2076,377 @@ def remove_duplicate_files(duplicates, root_folder):
         # Prompts user to see duplicate files before deletion       
         user_input1 = input("Duplicate files have been found. Would you like to see the files before they are deleted? (Yes/No):\n").strip().lower()
         if user_input1 == "yes":
+            duplicates_path = os.path.join(root_folder,"Duplicates")
+            manifest = []
+
             # Iterate over duplicate file paths
-            for file_paths in duplicates.values():
+            for file_hash, file_paths in duplicates.items():
                 if len(file_paths) > 1:
                     print(f"Duplicate files found:\n{file_paths}\n")
-                    # Copies duplicate files to a separate folder
-                    for file_path in file_paths[1:]:
-                        duplicates_path = os.path.join(root_folder,"Duplicates")
-                        if os.path.exists(duplicates_path) is False:
-                            os.makedirs(duplicates_path, exist_ok=True)
-                        copy_destination = os.path.join(duplicates_path, os.path.basename(file_path))
-                        shutil.copy(file_path,copy_destination)
-                        show_duplicates = True
-
-            if show_duplicates:        
-                # Prompts user to confirm deletion after copying duplicates
-                user_input2 = input("Duplicate files have been copied to 'Duplicates' folder. If you are okay to proceed with their deletion, enter 'Yes'. To cancel the operation, press any key. \n\n").strip().lower()
+                    # Links duplicate files into a separate folder instead of copying their content
+                    if os.path.exists(duplicates_path) is False:
+                        os.makedirs(duplicates_path, exist_ok=True)
+                    staged_paths = [stage_file_for_review(file_path, duplicates_path) for file_path in file_paths[1:]]
+                    manifest.append({"digest": file_hash, "kept": file_paths[0], "duplicates": file_paths[1:], "staged": staged_paths})
+                    show_duplicates = True
+
+            if show_duplicates:
+                manifest_path = os.path.join(duplicates_path, DUPLICATES_MANIFEST_NAME)
+                with open(manifest_path, "w") as f:
+                    json.dump(manifest, f, indent=2)
+
+                # Prompts user to confirm deletion after staging duplicates
+                user_input2 = input(f"Duplicate files have been linked into the 'Duplicates' folder and listed in '{manifest_path}'. If you are okay to proceed with their deletion, enter 'Yes'. To cancel the operation, press any key. \n\n").strip().lower()
                 for file_paths in duplicates.values():
                     for file_path in file_paths[1:]:
                         # Deletes duplicate files if user confirms
                         if user_input2 == "yes":
-                            os.remove(file_path)
-                            print(f"{file_path} has been deleted.\n")
+                            deleter.delete(file_path)
                         else:
                             print("Cancelling operation.")
                             exit
 
                 if user_input2 == "yes":
+                    deleter.wait()
                     shutil.rmtree(duplicates_path)
                             
         elif user_input1 == "no":
             # Deletes duplicate files without displaying them
             for file_paths in duplicates.values():
                 for file_path in file_paths[1:]:
-                    os.remove(file_path)
-                    print(f"{file_path} has been deleted.\n")
+                    deleter.delete(file_path)
         else:
             print("Cancelling operation.")
             exit
     else:
         print("No duplicates found.\n")
 
-def identify_live_photos_IOS(root_folder):
+    if owns_deleter:
+        deleter.close()
+    else:
+        deleter.wait()
+
+def read_exif_tags(file_paths, tags):
+
+    """ Reads the given tags of many files with one exiftool process per batch, returning a dictionary of tag values for each file. """
+
+    metadata = {}
+
+    for start in range(0, len(file_paths), EXIFTOOL_BATCH_SIZE):
+        batch = file_paths[start:start + EXIFTOOL_BATCH_SIZE]
+        try:
+            # Passes the file names on standard input, so batches are not limited by the command line length
+            result = subprocess.run(['exiftool', '-json', '-q'] + ['-' + tag for tag in tags] + ['-@', '-'],
+                                    input="\n".join(batch), capture_output=True, text=True)
+        except Exception as e:
+            print("An error occurred:", e)
+            continue
+
+        if result.stdout.strip():
+            for record in json.loads(result.stdout):
+                metadata[record.pop("SourceFile")] = record
+
+    return metadata
+
+def parse_exif_timestamp(value):
+
+    """ Converts an EXIF date such as '2023:05:01 10:15:30.25+02:00' to seconds since the epoch, or returns None if it is not a valid date. """
+
+    match = re.match(r'^(\d{4}):(\d{2}):(\d{2}) (\d{2}):(\d{2}):(\d{2})(\.\d+)?\s*(Z|[+-]\d{2}:?\d{2})?', str(value).strip())
+    if match is None or match.group(1) == "0000":
+        return None
+
+    year, month, day, hour, minute, second = (int(part) for part in match.groups()[:6])
+    timezone = datetime.timezone.utc
+    if match.group(8) and match.group(8) != "Z":
+        offset = match.group(8).replace(":", "")
+        delta = datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+        timezone = datetime.timezone(delta if offset[0] == "+" else -delta)
+
+    try:
+        # Dates without a time zone are read as UTC, which keeps them comparable with each other
+        timestamp = datetime.datetime(year, month, day, hour, minute, second, tzinfo=timezone).timestamp()
+    except ValueError:
+        return None
+    return timestamp + float(match.group(7) or 0)
+
+def get_capture_timestamp(tag_values, tags=CAPTURE_TIME_TAGS):
+
+    """ Returns the capture time of a file from the first of the given tags holding a valid date. """
+
+    for tag in tags:
+        if tag in tag_values:
+            timestamp = parse_exif_timestamp(tag_values[tag])
+            if timestamp is not None:
+                return timestamp
+    return None
+
+def compute_perceptual_hash(file_path):
+
+    """ Computes a 64-bit difference hash of a photo, which stays close for visually similar images, or returns None if it cannot be decoded. """
+
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(file_path) as image:
+            # Lets the JPEG decoder downscale while decoding, which is much faster than decoding at full size
+            image.draft("L", (64, 64))
+            pixels = np.asarray(image.convert("L").resize((9, 8)), dtype=np.int16)
+    except Exception:
+        return None
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def group_similar_frames(file_paths, max_distance):
+
+    """ Splits the frames of a burst into groups of visually similar photos, returning only groups of two or more. """
+
+    groups = []
+    for file_path in file_paths:
+        perceptual_hash = compute_perceptual_hash(file_path)
+        if perceptual_hash is None:
+            continue
+        for group_hash, group in groups:
+            if bin(group_hash ^ perceptual_hash).count("1") <= max_distance:
+                group.append(file_path)
+                break
+        else:
+            groups.append((perceptual_hash, [file_path]))
+
+    return [group for _, group in groups if len(group) > 1]
+
+def find_bursts(root_folder, window=1.0, max_distance=10):
+
+    """ 
+    
+    Finds bursts of similar photos taken in quick succession under the root folder.
+
+    Photos are sorted by capture time, with sub-second precision when available, and split wherever two consecutive photos are more 
+    than window seconds apart. Perceptual hashes are then only compared within each burst.
+
+    """
+
+    photo_paths = [record.path for record in scan_folder(root_folder) if os.path.splitext(record.name)[1].lower() in PHOTO_EXTENSIONS]
+
+    metadata = read_exif_tags(photo_paths, CAPTURE_TIME_TAGS)
+    paths = []
+    timestamps = []
+    for file_path in photo_paths:
+        timestamp = get_capture_timestamp(metadata.get(file_path, {}))
+        if timestamp is not None:
+            paths.append(file_path)
+            timestamps.append(timestamp)
+
+    if len(paths) < 2:
+        return []
+
+    import numpy as np
+
+    timestamps = np.array(timestamps, dtype=np.float64)
+    order = np.argsort(timestamps, kind="stable")
+
+    # A burst goes on for as long as each photo follows the previous one within the window
+    breaks = np.flatnonzero(np.diff(timestamps[order]) > window) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.append(breaks, len(order))
+
+    bursts = []
+    for start, end in zip(starts, ends):
+        if end - start > 1:
+            bursts.extend(group_similar_frames([paths[index] for index in order[start:end]], max_distance))
+    return bursts
+
+def review_bursts(bursts, root_folder, deleter=None):
+
+    """ Links each burst into its own folder for review, then deletes the photos whose link the reviewer removed. """
+
+    if not bursts:
+        print("No bursts of similar photos found.\n")
+        return
+
+    owns_deleter = deleter is None
+    if owns_deleter:
+        deleter = DeletionExecutor()
+
+    bursts_path = os.path.join(root_folder, BURSTS_FOLDER)
+    manifest = []
+    for number, burst in enumerate(bursts, start=1):
+        burst_path = os.path.join(bursts_path, f"{number:04d}")
+        os.makedirs(burst_path, exist_ok=True)
+        staged_paths = [stage_file_for_review(file_path, burst_path) for file_path in burst]
+        manifest.append({"burst": number, "photos": burst, "staged": staged_paths})
+
+    with open(os.path.join(bursts_path, BURSTS_MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    user_input = input(f"{len(bursts)} burst(s) of similar photos have been linked into the '{BURSTS_FOLDER}' folder. Delete the photos you do not want to keep from "
+                       "each burst folder, then enter 'Yes' to delete them from the library as well. To cancel the operation, press any key. \n\n").strip().lower()
+    if user_input == "yes":
+        for entry in manifest:
+            for file_path, staged_path in zip(entry["photos"], entry["staged"]):
+                # Removed links mark the photos the reviewer decided not to keep
+                if not os.path.lexists(staged_path):
+                    deleter.delete(file_path)
+        deleter.wait()
+        shutil.rmtree(bursts_path)
+    else:
+        print("No photos from bursts were deleted.\n")
+
+    if owns_deleter:
+        deleter.close()
+
+def is_live_photo_pair(file_paths):
+
+    """ Checks whether a group of files holds both a live photo still and its video, ignoring sidecars such as '.THM' or '.AAE' files. """
+
+    extensions = [os.path.splitext(file_path)[1].lower() for file_path in file_paths]
+    return any(extension in LIVE_PHOTO_VIDEO_EXTENSIONS for extension in extensions) and any(extension in PHOTO_EXTENSIONS for extension in extensions)
+
+def match_by_capture_time(stills, videos, tolerance):
+
+    """ 
     
-    """ Traverses through the root folder and identifies live photos based on iOS file naming conventions. """
+    Pairs stills with videos captured within tolerance seconds of each other, closest captures first.
+
+    Both arguments are lists of (timestamp, file path) tuples. Candidate pairs are found with a sliding window over both lists sorted 
+    by time and then taken from the closest to the farthest, so a file passed over by one still or video stays free for the next. 
+    Returns a list of (still path, video path) pairs.
+
+    """
+
+    import numpy as np
+
+    still_times = np.array([timestamp for timestamp, _ in stills], dtype=np.float64)
+    video_times = np.array([timestamp for timestamp, _ in videos], dtype=np.float64)
+    still_order = np.argsort(still_times, kind="stable")
+    video_order = np.argsort(video_times, kind="stable")
+
+    # Collects every still and video captured within the tolerance, keeping the window start on the first video not too early
+    candidates = []
+    window_start = 0
+    for i in still_order:
+        while window_start < len(video_order) and video_times[video_order[window_start]] < still_times[i] - tolerance:
+            window_start += 1
+        for j in video_order[window_start:]:
+            if video_times[j] > still_times[i] + tolerance:
+                break
+            candidates.append((abs(video_times[j] - still_times[i]), i, j))
+
+    # Takes the closest candidates first, skipping any whose still or video is already paired
+    candidates.sort(key=lambda candidate: candidate[0])
+    used_stills = set()
+    used_videos = set()
+    pairs = []
+    for _, i, j in candidates:
+        if i in used_stills or j in used_videos:
+            continue
+        used_stills.add(i)
+        used_videos.add(j)
+        pairs.append((stills[i][1], videos[j][1]))
+
+    return pairs
+
+def identify_live_photos_IOS(root_folder, tolerance=1.0):
+    
+    """ 
+    
+    Traverses through the root folder and pairs live photo stills with their videos.
+
+    Stills and videos are read in one batched exiftool pass and joined by the content identifier Apple writes to both. Files that 
+    could not be paired this way fall back to matching file names within the same folder, and then to pairing stills with short 
+    videos captured within tolerance seconds of them.
+
+    """
     
     # Initializes dictionaries to store live photo information
     livePhotos_filename = {}
     livePhotos_createdate = {}
 
-    # Recursively traverses the root folder and its subdirectories
-    for folder_path, _, file_names in os.walk(root_folder):
-        for file_name in file_names:
-            file_path = os.path.join(folder_path, file_name).lower()
-            file_name_without_extension = os.path.splitext(file_name)[0]
-             # Gets EXIF data including creation date and extension
-            exif_data = get_exif_create_date_and_extension(file_path, print_output = False)
+    file_paths = [record.path for record in scan_folder(root_folder)
+                  if os.path.splitext(record.name)[1].lower() in PHOTO_EXTENSIONS + LIVE_PHOTO_VIDEO_EXTENSIONS]
+
+    metadata = read_exif_tags(file_paths, ["ContentIdentifier", "Duration#"] + list(CAPTURE_TIME_TAGS) + list(VIDEO_CAPTURE_TIME_TAGS))
+
+    # Joins stills and videos sharing a content identifier through a single dictionary
+    by_identifier = {}
+    for file_path in file_paths:
+        identifier = metadata.get(file_path, {}).get("ContentIdentifier")
+        if identifier:
+            by_identifier.setdefault(str(identifier), []).append(file_path)
+
+    paired_files = set()
+    for identifier, group in by_identifier.items():
+        if is_live_photo_pair(group):
+            livePhotos_filename[identifier] = group
+            paired_files.update(group)
+
+    # Falls back to identical file names, only within a single folder, for files left unpaired
+    by_name = {}
+    for file_path in file_paths:
+        if file_path not in paired_files:
+            by_name.setdefault(os.path.splitext(file_path)[0], []).append(file_path)
+
+    for name, group in by_name.items():
+        if is_live_photo_pair(group):
+            livePhotos_filename[name] = group
+            paired_files.update(group)
+
+    # Falls back to capture times, parsed to numbers so sub-second and time zone differences do not prevent a match
+    stills = []
+    videos = []
+    capture_dates = {}
+    for file_path in file_paths:
+        if file_path in paired_files:
+            continue
+        tag_values = metadata.get(file_path, {})
+        if os.path.splitext(file_path)[1].lower() in LIVE_PHOTO_VIDEO_EXTENSIONS:
+            timestamp = get_capture_timestamp(tag_values, VIDEO_CAPTURE_TIME_TAGS)
+            try:
+                duration = float(tag_values.get("Duration"))
+            except (TypeError, ValueError):
+                continue
+            if timestamp is not None and duration <= LIVE_PHOTO_MAX_DURATION:
+                videos.append((timestamp, file_path))
+        else:
+            timestamp = get_capture_timestamp(tag_values)
+            if timestamp is not None:
+                stills.append((timestamp, file_path))
+                capture_dates[file_path] = next(str(tag_values[tag]) for tag in CAPTURE_TIME_TAGS if tag in tag_values)
 
-            # Stores file paths based on filename
-            if file_name_without_extension in livePhotos_filename:
-                livePhotos_filename[file_name_without_extension].append(file_path)
-            else:
-                livePhotos_filename[file_name_without_extension] = [file_path]
+    for still_path, video_path in match_by_capture_time(stills, videos, tolerance):
+        livePhotos_createdate.setdefault(capture_dates[still_path], []).extend([still_path, video_path])
 
-            # Stores file paths based on creation date (if available)
-            if exif_data is not None:
-                createdate = None
-                if isinstance(exif_data, tuple):
-                    createdate, _ = exif_data
+    return livePhotos_filename, livePhotos_createdate
 
-                elif isinstance(exif_data, str):
-                    if ":" in exif_data:
-                        createdate = exif_data
+def find_live_photo_companions(root_folder, file_records=None):
 
-                # Adds file paths to dictionary based on creation date
-                if createdate:
-                    if createdate in livePhotos_createdate:
-                        livePhotos_createdate[createdate].append(file_path)
-                    else:
-                        livePhotos_createdate[createdate] = [file_path]
+    """ Finds live photo videos that share their folder and file name with a photo, without running exiftool. """
 
-    return livePhotos_filename, livePhotos_createdate
+    stems = {}
+
+    # Groups the files under the root folder, or the given file records, by folder and name without extension
+    for record in file_records if file_records is not None else scan_folder(root_folder):
+        stems.setdefault(os.path.splitext(record.path)[0], []).append(record.path)
 
-def delete_live_photo_files(livePhotos_filename, livePhotos_createdate):
+    # Keeps only groups with both a video and a photo, so that videos are never matched with each other
+    return {stem: file_paths for stem, file_paths in stems.items() if is_live_photo_pair(file_paths)}
+
+def delete_live_photo_files(livePhotos_filename, livePhotos_createdate, deleter=None):
 
     """ Deletes live photo files (".mov" or ".mp4") based on given dictionaries containing file paths. """
     
     live_photo_found = False
+    owns_deleter = deleter is None
+    if owns_deleter:
+        deleter = DeletionExecutor()
 
      # Checks if live photo files are found based on filenames
     for file_paths in livePhotos_filename.values():
         if len(file_paths) > 1:
             for file_path in file_paths:
-                if (".mov" in file_path or ".mp4" in file_path):
+                if os.path.splitext(file_path)[1].lower() in LIVE_PHOTO_VIDEO_EXTENSIONS:
                     live_photo_found = True
                     break
 
@@ -455,7 +2455,7 @@ def delete_live_photo_files(livePhotos_filename, livePhotos_createdate):
         for file_paths in livePhotos_createdate.values():
             if len(file_paths) > 1:
                 for file_path in file_paths:
-                    if (".mov" in file_path or ".mp4" in file_path):
+                    if os.path.splitext(file_path)[1].lower() in LIVE_PHOTO_VIDEO_EXTENSIONS:
                         live_photo_found = True
                         break
 
@@ -467,13 +2467,12 @@ def delete_live_photo_files(livePhotos_filename, livePhotos_createdate):
                 if len(file_paths) > 1:
                     # If multiple file paths exist for the same filename, iterates over each path
                     for file_path in file_paths:
-                        if os.path.exists(file_path):
+                        if os.path.exists(file_path) and not deleter.is_scheduled(file_path):
                             _, file_extension = os.path.splitext(file_path)
                             if file_extension.lower() in [".mov", ".mp4"]:
                                 # Deletes the file if it meets the criteria
                                 print(f"Live video(s) were found for '{file_name}':\n{file_paths}\n")
-                                os.remove(file_path)
-                                print(f"{file_path} has been deleted.\n")
+                                deleter.delete(file_path)
             
             # Iterates over creation dates and file paths
             for createdate, file_paths in livePhotos_createdate.items():
@@ -486,17 +2485,15 @@ def delete_live_photo_files(livePhotos_filename, livePhotos_createdate):
                         # If non-mov/mp4 files exist, deletes all mov/mp4 files
                         mov_mp4_files = [file_path for file_path in file_paths if os.path.splitext(file_path)[1].lower() in [".mov", ".mp4"]]
                         for file_path in mov_mp4_files:
-                            if os.path.exists(file_path):
+                            if os.path.exists(file_path) and not deleter.is_scheduled(file_path):
                                 print(f"Multiple files were found with creation date '{createdate}':\n{file_paths}\n")
-                                os.remove(file_path)
-                                print(f"{file_path} has been deleted.\n")
+                                deleter.delete(file_path)
                     else:
                         # If only mov/mp4 files exist, keeps one and deletes the rest
                         mov_mp4_files = [file_path for file_path in file_paths if os.path.splitext(file_path)[1].lower() in [".mov", ".mp4"]]
                         for file_path in mov_mp4_files[:-1]:
                             print(f"Multiple files were found with creation date '{createdate}':\n{file_paths}\n")
-                            os.remove(file_path)
-                            print(f"{file_path} has been deleted.\n")
+                            deleter.delete(file_path)
 
         elif user_input == "no":
             print("No files were deleted.")
@@ -505,21 +2502,246 @@ def delete_live_photo_files(livePhotos_filename, livePhotos_createdate):
     else:
         print("No live photos found.\n")
 
+    if owns_deleter:
+        deleter.close()
+    else:
+        deleter.wait()
+
+
+class FolderWatcher:
+
+    """ Watches a folder tree with inotify, reporting files that have been written or moved into it and watching new subfolders. """
+
+    def __init__(self, root_folder, skip_folder=None):
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.skip_folder = skip_folder
+        self.root_folder = root_folder
+        self.folders = {}
+        self.add_folder(root_folder)
+
+    def add_folder(self, folder_path):
+
+        """ Watches a folder and its subfolders, and returns the files already inside them. """
+
+        file_paths = []
+        for folder_path, dirnames, file_names in os.walk(folder_path):
+            dirnames[:] = [dirname for dirname in dirnames if not is_pruned_folder(os.path.join(folder_path, dirname), self.root_folder)
+                           and (self.skip_folder is None or not self.skip_folder(os.path.join(folder_path, dirname)))]
+            descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(folder_path), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if descriptor < 0:
+                print(f"Could not watch {folder_path}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self.folders[descriptor] = folder_path
+            file_paths.extend(os.path.join(folder_path, file_name) for file_name in file_names if is_scanned_file(file_name))
+        return file_paths
+
+    def read_events(self, timeout):
+
+        """ Waits up to timeout seconds, or forever if timeout is None, and returns the paths of the files that have arrived. """
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        file_paths = []
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, name_length = struct.unpack_from("iIII", data, offset)
+            name = os.fsdecode(data[offset + 16:offset + 16 + name_length].rstrip(b"\0"))
+            offset += 16 + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so every watched folder is listed again
+                for folder_path in set(self.folders.values()):
+                    file_paths.extend(record.path for record in scan_folder(folder_path))
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(descriptor, None)
+                continue
+
+            folder_path = self.folders.get(descriptor)
+            if folder_path is None or not name:
+                continue
+            path = os.path.join(folder_path, name)
+            if mask & IN_ISDIR:
+                if not is_pruned_folder(path, self.root_folder) and (self.skip_folder is None or not self.skip_folder(path)):
+                    # Files can land in a new folder before it is watched, so the ones already there are reported too
+                    file_paths.extend(self.add_folder(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_scanned_file(name):
+                file_paths.append(path)
+        return file_paths
+
+    def close(self):
+        os.close(self.fd)
+
+def organize_new_file(file_path, args, created_folders, connection, library_filter, deleter):
+
+    """ Organizes a single file that has arrived in watch mode, deleting it instead if the library already holds a copy. """
+
+    if not is_media_file(file_path):
+        return library_filter
+
+    duplicates = find_duplicate_files_in_library([file_path], args.target, connection, library_filter)
+    for file_paths in duplicates.values():
+        if file_path in file_paths:
+            print(f"{file_path} is identical to {file_paths[0]} and has been deleted.\n")
+            deleter.delete(file_path)
+            return library_filter
+
+    moved_files = {}
+    categorize_files(file_path, args, created_folders, moved_files, deleter)
+    if moved_files:
+        copy_digests = {path: file_hash for path, file_hash in moved_files.items() if file_hash}
+        library_filter = add_files_to_library_index(list(moved_files), args.target, connection, library_filter, copy_digests)
+    return library_filter
+
+def watch_folder(path, created_folders, args, deleter):
+
+    """ 
+
+    Organizes files as they arrive in the given folder, until interrupted.
+
+    Each file is organized once it has stayed unchanged for WATCH_SETTLE_SECONDS after being written or moved in, so files that 
+    are still being uploaded are left alone. Files already in the folder are organized first, and the process sleeps in between.
+
+    """
+
+    if platform.system() != "Linux":
+        print("Error: Watch mode is only supported on Linux.")
+        return
+
+    connection = open_library_index(args.target)
+    library_filter = load_library_filter(args.target)
+    if library_filter is None:
+        print("Indexing the library...\n")
+        library_filter = build_library_index(args.target, connection)
+
+    # When the target itself is watched, the folders files are organized into are not
+    skip_folder = None
+    if os.path.abspath(path) == os.path.abspath(args.target):
+        skip_folder = lambda folder_path: is_in_organized_folder(folder_path, args.target)
+    watcher = FolderWatcher(path, skip_folder)
+
+    # Maps each waiting file to the time it becomes due and the size and modification time it had when it last changed
+    waiting_files = {}
+
+    def schedule(file_path):
+        try:
+            stat_result = os.stat(file_path)
+        except OSError:
+            return
+        waiting_files[file_path] = (time.monotonic() + WATCH_SETTLE_SECONDS, stat_result.st_size, stat_result.st_mtime_ns)
+
+    for record in scan_folder(path):
+        if skip_folder is None or not skip_folder(record.folder_path):
+            schedule(record.path)
+
+    print(f"Watching {path} for new files. Press Ctrl+C to stop.\n")
+    try:
+        while True:
+            timeout = None
+            if waiting_files:
+                timeout = max(0, min(due for due, _, _ in waiting_files.values()) - time.monotonic())
+            for file_path in watcher.read_events(timeout):
+                schedule(file_path)
+
+            now = time.monotonic()
+            for file_path, (due, size, mtime_ns) in list(waiting_files.items()):
+                if due > now:
+                    continue
+                del waiting_files[file_path]
+                try:
+                    stat_result = os.stat(file_path)
+                except OSError:
+                    continue
+                if (stat_result.st_size, stat_result.st_mtime_ns) != (size, mtime_ns):
+                    # Still being written, so it waits for another quiet period
+                    schedule(file_path)
+                    continue
+                # Keeps watching when a single file fails, for instance because it vanished before it could be moved
+                try:
+                    library_filter = organize_new_file(file_path, args, created_folders, connection, library_filter, deleter)
+                except Exception as e:
+                    print(f"An error occurred while organizing {file_path}: {e}\n")
+
+            # Does not hold on to upload folders between batches, so they can be removed or renamed
+            directory_handles.close()
+            if metadata_cache is not None:
+                metadata_cache.flush()
+    except KeyboardInterrupt:
+        print("Stopped watching.\n")
+    finally:
+        watcher.close()
+        deleter.wait()
+        connection.close()
+        if metadata_cache is not None:
+            metadata_cache.flush()
+
+def is_in_destination(file_path, args):
+
+    """ 
+
+    Checks whether a file already sits in the folder categorize_files would move it to, judging from its path and, when the metadata 
+    cache holds it, its creation date, so that no file content is read.
+
+    """
+
+    relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(args.target))
+    folders = relative_path.split(os.sep)[:-1]
+    if folders == ["Uncategorized"]:
+        expected_folders = folders
+    elif args.format == "month" and len(folders) == 2 and re.match(r'^\d{4}$', folders[0]) and folders[1] in MONTH_FOLDERS:
+        expected_folders = folders
+    elif args.format == "year" and len(folders) == 1 and re.match(r'^\d{4}$', folders[0]):
+        expected_folders = folders
+    else:
+        return False
+
+    # Double-checks the folder against a creation date extracted by an earlier run
+    if metadata_cache is not None:
+        create_date = metadata_cache.get(file_path).get("createdate")
+        if create_date is not None:
+            year = extract_year_from_file(create_date) if ":" in create_date else None
+            month = extract_month_from_file(create_date) if year else None
+            if year is None or (args.format == "month" and month is None):
+                expected_folders = ["Uncategorized"]
+            else:
+                expected_folders = [year, month] if args.format == "month" else [year]
+    return folders == expected_folders
 
-def run_process(path, created_folders, args):
+def run_process(path, created_folders, args, moved_files=None, deleter=None, file_records=None):
 
     """ Processes the target path (either a directory or a file), organizing media files into folders by their creation year. """
 
     if (os.path.isdir(path)):
             directory = path
 
-            # Recursively traverses the root folder and its subdirectories
-            for root, dirs, files in os.walk(directory):
-                for name in files:
-                    file = os.path.join(root, name)
-                    if is_media_file(file):
-                        created_folders.update(categorize_files(file, args, created_folders))
-            delete_empty_folders(directory, created_folders)
+            # Recursively traverses the root folder and its subdirectories, unless the files to organize were read from a list
+            records = file_records if file_records is not None else scan_folder(directory)
+            for record in records:
+                # Leaves files that are already organized, or already deleted by an earlier stage, alone without reading them
+                if is_in_destination(record.path, args) or (deleter is not None and deleter.is_scheduled(record.path)):
+                    continue
+                if is_media_file(record.path):
+                    created_folders.update(categorize_files(record.path, args, created_folders, moved_files, deleter))
+            if metadata_cache is not None:
+                metadata_cache.flush()
+            # Closes the folders opened to move files before any of them is removed
+            directory_handles.close()
+            if deleter is not None:
+                deleter.wait()
+
+            # Leaves the folder structure of an ingest source, such as a memory card, untouched
+            if not args.source:
+                delete_empty_folders(directory, created_folders)
     else:
         print("Error: Please input a valid directory.")
 
@@ -534,32 +2756,199 @@ def main():
         "-f", "--format", default="year",
         help="custom format for folder names. "
         "Default is year.")
+    parser.add_argument(
+        "--library-index", action="store_true",
+        help="keep a persistent filter and digest index of the organized library "
+        "so later runs only check newly organized files for duplicates.")
+    parser.add_argument(
+        "--source",
+        help="import media files from this directory into the target, copying each "
+        "file once and hashing it during the copy. The source file is deleted "
+        "only after its copy has been committed.")
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="read back each copied file and check its digest before deleting the source.")
+    parser.add_argument(
+        "--trash", action="store_true",
+        help="move deleted files into a .trash folder under the target instead of "
+        "deleting them, so they can be restored.")
+    parser.add_argument(
+        "--delete-workers", type=int, default=DELETE_WORKERS,
+        help="number of files deleted concurrently in the background. "
+        f"Default is {DELETE_WORKERS}.")
+    parser.add_argument(
+        "--dedup-first", action="store_true",
+        help="remove duplicates and live photo videos before organizing, so they are "
+        "never probed or moved. Copies already in the organized folders are kept.")
+    parser.add_argument(
+        "--direct-io", action="store_true",
+        help="read file content with O_DIRECT where supported, bypassing the page cache.")
+    parser.add_argument(
+        "--max-read-mbps", type=float,
+        help="limit reads of file content to this many megabytes per second.")
+    parser.add_argument(
+        "--max-iops", type=float,
+        help="limit reads of file content to this many read operations per second.")
+    parser.add_argument(
+        "--read-order", choices=("auto", "walk", "inode", "extent"), default="auto",
+        help="order in which files are hashed: 'extent' sorts them by where their data lies on disk, 'inode' by "
+        "inode number and 'walk' keeps the folder order. 'auto' uses 'extent' on rotational disks and 'walk' "
+        "elsewhere, deciding for each device. Default is auto.")
+    parser.add_argument(
+        "--benchmark-read-order", action="store_true",
+        help="time reading the start of every file under the target in walk order and in the --read-order order, then exit.")
+    parser.add_argument(
+        "--live-photo-tolerance", type=float, default=1.0,
+        help="maximum number of seconds between the capture times of a live photo and its video, "
+        "for files that cannot be paired otherwise. Default is 1.")
+    parser.add_argument(
+        "--find-bursts", action="store_true",
+        help="group bursts of similar photos taken in quick succession, so you can keep one of each.")
+    parser.add_argument(
+        "--burst-window", type=float, default=1.0,
+        help="maximum number of seconds between two photos of the same burst. Default is 1.")
+    parser.add_argument(
+        "--cache", action="store_true",
+        help="cache file digests and extracted metadata under the target, so later runs "
+        "reuse them for files that have not changed.")
+    parser.add_argument(
+        "--xattr-cache", action="store_true",
+        help="store cached values in 'user.fileorganizer.*' extended attributes of each file, "
+        "where other runs and tools can reuse them. Implies --cache.")
+    parser.add_argument(
+        "--background", action="store_true",
+        help="lower the CPU and I/O priority of this run and of the exiftool processes it starts.")
+    parser.add_argument(
+        "--scan-workers", type=int, default=1,
+        help="number of folders listed concurrently, which speeds up scans of network shares. Default is 1.")
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running and organize files as soon as they are written to the source, or to the target "
+        "without --source. Files already in the library index are deleted instead. Linux only.")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="remember folder listings under the target, so later runs only list folders that have changed.")
+    parser.add_argument(
+        "--from-list", metavar="FILE",
+        help="organize the files listed in FILE, or on standard input if FILE is '-', instead of scanning the "
+        "source or target. Paths are separated by NUL characters or newlines, and may be preceded by a size "
+        "and a modification time separated by tabs.")
+    parser.add_argument(
+        "--include", action="append", default=[], metavar="PATTERN",
+        help="only process files whose name matches this pattern, such as '*.jpg'. Can be given several times.")
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="PATTERN",
+        help="skip files whose name matches this pattern. Can be given several times.")
+    parser.add_argument(
+        "--prune", action="append", default=[], metavar="PATTERN",
+        help="do not descend into folders whose name matches this pattern, in addition to "
+        f"{', '.join(DEFAULT_PRUNED_FOLDERS)}. Can be given several times.")
+    parser.add_argument(
+        "--no-default-prune", action="store_true",
+        help="descend into the folders of other tools that are pruned by default.")
         
     args = parser.parse_args()
+    configure_reads(args.direct_io, args.max_read_mbps, args.max_iops, args.read_order)
+    if args.from_list == "-":
+        # The list takes up standard input, so questions are read from the terminal from the start
+        try:
+            sys.stdin = open("/dev/tty")
+        except OSError:
+            pass
+    configure_scanning(args.scan_workers, args.target if args.incremental else None,
+                       args.prune + ([] if args.no_default_prune else list(DEFAULT_PRUNED_FOLDERS)), args.include, args.exclude)
+    if args.background:
+        apply_background_priority()
+    if args.cache or args.xattr_cache:
+        configure_metadata_cache(args.target, args.xattr_cache)
+    if args.benchmark_read_order:
+        benchmark_read_order(args.target)
+        return
 
     # Initializes a set to keep track of created folders
     created_folders = set()
-
-     # Runs the file organization process
-    run_process(args.target, created_folders, args)
-
-    # After organizing files, finds and removes duplicates
-    print("Searching for duplicate files...\n")
-    duplicates = find_duplicate_files(args.target)
-    remove_duplicate_files(duplicates, args.target)
+    moved_files = {}
+    deleter = DeletionExecutor(args.target if args.trash else None, args.delete_workers)
+
+    if args.watch:
+        watch_folder(args.source or args.target, created_folders, args, deleter)
+        deleter.close()
+        return
+
+    connection = None
+    library_filter = None
+    if args.library_index:
+        connection = open_library_index(args.target)
+        library_filter = load_library_filter(args.target)
+
+    # Reads the files to organize from a list instead of scanning for them, keeping them for every stage that needs them
+    file_records = read_file_list(args.from_list, args.target) if args.from_list else None
+    if file_records is not None and args.dedup_first:
+        file_records = list(file_records)
+
+    if args.dedup_first:
+        # Drops redundant copies and live photo videos before any file is probed or moved
+        print("Searching for duplicate files before organizing...\n")
+        duplicates = find_duplicates_before_organizing(args.source or args.target, args.target, connection, library_filter, file_records)
+        remove_duplicate_files(duplicates, args.target, deleter)
+
+        print("Searching for live photo files before organizing...\n")
+        delete_live_photo_files(find_live_photo_companions(args.source or args.target, file_records), {}, deleter)
+
+     # Runs the file organization process, importing from the source directory if one is given
+    run_process(args.source or args.target, created_folders, args, moved_files, deleter, file_records)
+    copy_digests = {file_path: file_hash for file_path, file_hash in moved_files.items() if file_hash}
+
+    if args.dedup_first:
+        # The duplicates were already removed, so only the library index needs to learn about the organized files
+        if args.library_index:
+            if library_filter is None:
+                build_library_index(args.target, connection, copy_digests)
+            else:
+                add_files_to_library_index(list(moved_files), args.target, connection, library_filter, copy_digests)
+            connection.close()
+    elif args.library_index:
+        # After organizing files, finds and removes duplicates
+        print("Searching for duplicate files...\n")
+        if library_filter is None:
+            # Indexes the whole library on the first run
+            duplicates = find_duplicate_files(args.target, copy_digests)
+            remove_duplicate_files(duplicates, args.target, deleter)
+            known_digests = {file_path: file_hash for file_hash, file_paths in duplicates.items() for file_path in file_paths}
+            build_library_index(args.target, connection, {**copy_digests, **known_digests})
+        else:
+            # Only checks the files organized during this run against the library
+            duplicates = find_duplicate_files_in_library(list(moved_files), args.target, connection, library_filter, copy_digests)
+            remove_duplicate_files(duplicates, args.target, deleter)
+            known_digests = {file_path: file_hash for file_hash, file_paths in duplicates.items() for file_path in file_paths}
+            add_files_to_library_index(list(moved_files), args.target, connection, library_filter, {**copy_digests, **known_digests})
+        connection.close()
+    else:
+        # After organizing files, finds and removes duplicates
+        print("Searching for duplicate files...\n")
+        duplicates = find_duplicate_files(args.target, copy_digests)
+        remove_duplicate_files(duplicates, args.target, deleter)
 
     # Identifies and deletes live photos
     print("Searching for live photo files...\n")
-    livePhotos_filename, livePhotos_createdate = identify_live_photos_IOS(args.target)
-    delete_live_photo_files(livePhotos_filename, livePhotos_createdate)
+    livePhotos_filename, livePhotos_createdate = identify_live_photos_IOS(args.target, args.live_photo_tolerance)
+    delete_live_photo_files(livePhotos_filename, livePhotos_createdate, deleter)
+
+    if args.find_bursts:
+        print("Searching for bursts of similar photos...\n")
+        review_bursts(find_bursts(args.target, args.burst_window), args.target, deleter)
 
     # Identifies and deletes "aae" files
     print("Searching for '.aae' files...\n")
-    remove_aae_files(args.target)
+    remove_aae_files(args.target, deleter)
 
     # Identifies and corrects file extension mismatches
     print("Searching for files with extension mismatches...\n")
     find_and_fix_file_extension_mismatches(args.target)
 
+    deleter.close()
+    if metadata_cache is not None:
+        metadata_cache.flush()
+
 if __name__ == "__main__":
     main()
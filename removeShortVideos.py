@@ -1,13 +1,128 @@
+import argparse
+import concurrent.futures
+import json
 import subprocess
 import os
-import sys
+import struct
+import threading
+import filetype
 
-def get_exif_duration(filepath, print_output = True):
+from organizeMediaFiles import (DEFAULT_PRUNED_FOLDERS, DeletionExecutor, MetadataCache, METADATA_CACHE_NAME, STATE_FOLDER, configure_reads, configure_scanning,
+                               format_size, order_for_reading, read_file_header, read_file_list, scan_folder, throttle_read, account_read_bytes)
 
-    """ Extracts the creation date of a file using exiftool. """
+# Extensions accepted as videos without reading the file
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".avi", ".wmv", ".flv", ".mkv", ".webm", ".mpg", ".mpeg", ".3gp")
 
+# Default number of files probed concurrently
+PROBE_WORKERS = os.cpu_count() or 4
+
+# Width of the longest bar of the duration histogram
+HISTOGRAM_WIDTH = 40
+
+class ExiftoolProcess:
+
+    """ Long-running exiftool process that handles one command at a time, saving the start-up cost of a new process per file. """
+
+    def __init__(self):
+        self.process = subprocess.Popen(['exiftool', '-stay_open', 'True', '-@', '-'], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+    def execute(self, *args):
+
+        """ Runs exiftool with the given arguments and returns its output. """
+
+        self.process.stdin.write("\n".join(args) + "\n-execute\n")
+        self.process.stdin.flush()
+
+        # Reads the output up to the marker exiftool prints once the command is done
+        lines = []
+        for line in self.process.stdout:
+            if line.strip() == "{ready}":
+                break
+            lines.append(line)
+        return "".join(lines)
+
+    def close(self):
+        try:
+            self.process.stdin.write("-stay_open\nFalse\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=10)
+        except Exception:
+            self.process.kill()
+
+def is_video_candidate(file_path):
+
+    """ Checks whether a file is a video container from its extension or, failing that, from the magic bytes of its header. """
+
+    if os.path.splitext(file_path)[1].lower() in VIDEO_EXTENSIONS:
+        return True
     try:
-        result = subprocess.run(['exiftool', '-Duration', filepath], capture_output=True, text=True)
+        return filetype.is_video(read_file_header(file_path))
+    except OSError:
+        return False
+
+def read_box_header(f):
+
+    """ Reads the size and type of the next box of an MP4 or QuickTime file, or returns None at the end of the file. """
+
+    throttle_read()
+    header = f.read(8)
+    account_read_bytes(len(header))
+    if len(header) < 8:
+        return None
+
+    size, box_type = struct.unpack(">I4s", header)
+    header_size = 8
+    if size == 1:
+        size = struct.unpack(">Q", f.read(8))[0]
+        header_size = 16
+    elif size == 0:
+        # A size of zero means the box extends to the end of the file
+        size = os.fstat(f.fileno()).st_size - f.tell() + 8
+    return size, box_type, header_size
+
+def get_container_duration(filepath):
+
+    """ Reads the duration of an MP4 or QuickTime video from its movie header, without starting exiftool. Returns None for other files. """
+
+    try:
+        with open(filepath, 'rb') as f:
+            end = os.fstat(f.fileno()).st_size
+            # Walks the top-level boxes, then the boxes inside 'moov', until the movie header is found
+            while f.tell() < end:
+                box = read_box_header(f)
+                if box is None:
+                    return None
+                size, box_type, header_size = box
+                if size < header_size:
+                    return None
+
+                if box_type == b"moov":
+                    end = f.tell() - header_size + size
+                elif box_type == b"mvhd":
+                    throttle_read()
+                    data = f.read(32)
+                    account_read_bytes(len(data))
+                    if data[0] == 1:
+                        timescale, duration = struct.unpack(">IQ", data[20:32])
+                    else:
+                        timescale, duration = struct.unpack(">II", data[12:20])
+                    return duration / timescale if timescale else None
+                else:
+                    f.seek(size - header_size, os.SEEK_CUR)
+    except (OSError, struct.error, IndexError):
+        return None
+    return None
+
+def get_exif_duration(filepath, print_output = True, exiftool=None):
+
+    """ Extracts the duration of a file using exiftool, or a running ExiftoolProcess if one is given. """
+
+    try:
+        if exiftool is not None:
+            result = subprocess.CompletedProcess([], 0, exiftool.execute('-Duration', filepath), "")
+        else:
+            result = subprocess.run(['exiftool', '-Duration', filepath], capture_output=True, text=True)
         if result.returncode == 0:
             duration_info = result.stdout.strip().split(": ")[1]
 
@@ -41,43 +156,230 @@ def get_exif_duration(filepath, print_output = True):
             print("An error occurred:", e)
         return None
     
-def delete_short_videos(root_folder, threshold):
-
-    short_videos_found = False
-
-    # Recursively traverses the root folder and its subdirectories
-    for folder_path, _, file_names in os.walk(root_folder):
-        for file_name in file_names:
-            file_path = os.path.join(folder_path, file_name)
-            exif_data = get_exif_duration(file_path, print_output = False)
-            if exif_data is not None:
-                exif_duration = exif_data
-
-                # Converts the duration value to a floating-point number if needed
-                duration_time = float(exif_duration)
-                
-                if duration_time <= threshold:
-                    short_videos_found = True
-                    os.remove(file_path)
-                    print(f"{file_path} has been deleted.\n")
-
-    if not short_videos_found:
-        print(f"No vidoes with the length of {threshold} or less were found")
-                
-def main():
-    if len(sys.argv) != 4 or sys.argv[2] != "-d":
-        print("Usage: python script_name.py root_folder -d integer_for_duration_threshold")
-        sys.exit(1)
+def probe_video_durations(file_paths, workers=PROBE_WORKERS, cache=None):
+
+    """ 
+    
+    Probes the duration of many videos in parallel, returning (file path, duration) tuples.
+
+    MP4 and QuickTime durations are read from the movie header in-process. Other containers are probed by one long-running 
+    exiftool process per worker thread. With a MetadataCache, durations probed by an earlier run are reused and new ones are saved.
+
+    """
+
+    local = threading.local()
+    processes = []
+    lock = threading.Lock()
+
+    def probe(file_path):
+        stat_result = None
+        if cache is not None:
+            stat_result = os.stat(file_path)
+            cached = cache.get(file_path, stat_result)
+            if "duration" in cached:
+                # An empty value records a file that was probed but has no duration
+                return float(cached["duration"]) if cached["duration"] else None
+
+        duration = get_container_duration(file_path)
+        if duration is None:
+            if not hasattr(local, "exiftool"):
+                try:
+                    local.exiftool = ExiftoolProcess()
+                except OSError:
+                    # Leaves the duration unknown, and uncached, when exiftool cannot be started
+                    local.exiftool = None
+                else:
+                    with lock:
+                        processes.append(local.exiftool)
+            if local.exiftool is None:
+                return None
+            duration = get_exif_duration(file_path, print_output = False, exiftool=local.exiftool)
+
+        if cache is not None:
+            cache.update(file_path, stat_result, duration="" if duration is None else str(duration))
+        return duration
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(zip(file_paths, pool.map(probe, file_paths)))
+    finally:
+        for process in processes:
+            process.close()
+        if cache is not None:
+            cache.flush()
+
+def collect_video_durations(root_folder, workers=PROBE_WORKERS, cache=None, file_records=None):
+
+    """ 
     
-    root_folder = sys.argv[1]
+    Probes every video under the root folder, or among the given file records, returning (file path, duration in whole seconds, 
+    size in bytes) tuples.
+
+    """
+
+    candidates = []
+
+    # Recursively traverses the root folder and its subdirectories, unless the files were listed already
+    for record in file_records if file_records is not None else scan_folder(root_folder):
+        # Only probes video containers, skipping photos, sidecars and other files
+        if is_video_candidate(record.path):
+            candidates.append(record)
+
+    videos = []
+    # Probes the videos in the order their data lies on disk where that is enabled
+    ordered_records = order_for_reading(candidates)
+    for record, (_, duration) in zip(ordered_records, probe_video_durations([record.path for record in ordered_records], workers, cache)):
+        if duration is not None:
+            videos.append((record.path, round(duration), record.size))
+    return videos
+
+def find_videos_by_duration(root_folder, min_duration=0, max_duration=None, workers=PROBE_WORKERS, cache=None, file_records=None):
+
+    """ Finds the videos under the root folder, or among the given file records, whose duration in whole seconds lies within the given bounds. """
+
+    matches = []
+    for file_path, duration, _ in collect_video_durations(root_folder, workers, cache, file_records):
+        if min_duration <= duration and (max_duration is None or duration <= max_duration):
+            matches.append((file_path, duration))
+    return matches
+
+def report_video_durations(videos, max_seconds, as_json=False):
+
+    """ Prints a histogram of video durations and how many videos and bytes each threshold from 1 to max_seconds would delete. """
+
+    counts = [0] * (max_seconds + 1)
+    sizes = [0] * (max_seconds + 1)
+    for _, duration, size in videos:
+        if duration <= max_seconds:
+            counts[duration] += 1
+            sizes[duration] += size
+
+    rows = []
+    cumulative_count = counts[0]
+    cumulative_size = sizes[0]
+    for seconds in range(1, max_seconds + 1):
+        cumulative_count += counts[seconds]
+        cumulative_size += sizes[seconds]
+        rows.append({"seconds": seconds, "videos": counts[seconds], "bytes": sizes[seconds],
+                     "videos_at_or_below": cumulative_count, "bytes_at_or_below": cumulative_size})
+
+    if as_json:
+        print(json.dumps({"videos_probed": len(videos), "thresholds": rows}, indent=2))
+        return
+
+    print(f"{len(videos)} video(s) probed. Videos lasting less than a second: {counts[0]} ({format_size(sizes[0])}).\n")
+    print(f"{'Seconds':>7}  {'Videos':>7}  {'Size':>9}  {'-d deletes':>10}  {'Reclaims':>9}")
+    largest = max(counts[1:], default=0) or 1
+    for row in rows:
+        bar = "#" * round(row["videos"] / largest * HISTOGRAM_WIDTH)
+        print(f"{row['seconds']:>7}  {row['videos']:>7}  {format_size(row['bytes']):>9}  "
+              f"{row['videos_at_or_below']:>10}  {format_size(row['bytes_at_or_below']):>9}  {bar}")
+    print()
 
-    if sys.argv[3].isdigit():
-        threshold = int(sys.argv[3])
+def delete_short_videos(root_folder, threshold, deleter=None, min_duration=0, workers=PROBE_WORKERS, dry_run=False, print_output=True, cache=None,
+                        file_records=None):
+
+    """ Deletes the videos under the root folder lasting between min_duration and threshold seconds, and returns them with their duration. """
+
+    owns_deleter = deleter is None
+    if owns_deleter:
+        deleter = DeletionExecutor()
+
+    matches = find_videos_by_duration(root_folder, min_duration, threshold, workers, cache, file_records)
+
+    for file_path, duration in matches:
+        if dry_run:
+            if print_output:
+                print(f"{file_path} ({duration} seconds) would be deleted.")
+        else:
+            deleter.delete(file_path)
+
+    if not matches and print_output:
+        print(f"No vidoes with the length of {threshold} or less were found")
+
+    if owns_deleter:
+        deleter.close(print_summary=print_output)
     else:
-        print("Threshold value must be an integer.")
-        sys.exit(1)
-    print(f"Searching for videos with the length of {threshold} seconds or less...\n")
-    delete_short_videos(root_folder, threshold)
+        deleter.wait()
+    return matches
+
+def main():
+    # Parses command-line arguments
+    parser = argparse.ArgumentParser(
+        description="Delete videos whose duration lies within the given bounds")
+    parser.add_argument(
+        "root_folder", nargs="?",
+        help="directory to search for videos. Optional with --from-list, where it only holds the duration cache.")
+    parser.add_argument(
+        "-d", "--max", dest="max_duration", type=int,
+        help="delete videos lasting this many seconds or less")
+    parser.add_argument(
+        "--min", dest="min_duration", type=int, default=0,
+        help="only delete videos lasting at least this many seconds. Default is 0.")
+    parser.add_argument(
+        "--workers", type=int, default=PROBE_WORKERS,
+        help=f"number of videos probed concurrently. Default is {PROBE_WORKERS}.")
+    parser.add_argument(
+        "--scan-workers", type=int, default=1,
+        help="number of folders listed concurrently, which speeds up scans of network shares. Default is 1.")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="remember folder listings under the root folder, so later runs only list folders that have changed.")
+    parser.add_argument(
+        "--from-list", metavar="FILE",
+        help="probe the files listed in FILE, or on standard input if FILE is '-', instead of scanning the root folder. "
+        "Paths are separated by NUL characters or newlines, and may be preceded by a size and a modification time separated by tabs.")
+    parser.add_argument(
+        "--exclude", action="append", default=[], metavar="PATTERN",
+        help="skip videos whose name matches this pattern. Can be given several times.")
+    parser.add_argument(
+        "--prune", action="append", default=[], metavar="PATTERN",
+        help="do not descend into folders whose name matches this pattern, in addition to "
+        f"{', '.join(DEFAULT_PRUNED_FOLDERS)}. Can be given several times.")
+    parser.add_argument(
+        "--read-order", choices=("auto", "walk", "inode", "extent"), default="auto",
+        help="order in which videos are probed: 'extent' sorts them by where their data lies on disk, 'inode' by "
+        "inode number and 'walk' keeps the folder order. 'auto' uses 'extent' on rotational disks only. Default is auto.")
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="list the videos that would be deleted without deleting them")
+    parser.add_argument(
+        "--json", action="store_true",
+        help="print the matching videos as JSON instead of messages")
+    parser.add_argument(
+        "--report", type=int, metavar="MAX_SECONDS",
+        help="print how many videos and bytes each threshold from 1 to MAX_SECONDS would delete, "
+        "without deleting anything. The probed durations are saved so a later deletion does not probe again.")
+
+    args = parser.parse_args()
+    if args.root_folder is None and args.from_list is None:
+        parser.error("a root folder or --from-list is required")
+    configure_reads(order=args.read_order)
+    configure_scanning(args.scan_workers, args.root_folder if args.incremental else None,
+                       args.prune + list(DEFAULT_PRUNED_FOLDERS), exclude=args.exclude)
+    file_records = read_file_list(args.from_list, args.root_folder) if args.from_list else None
+
+    # Reuses the durations saved by an earlier report, or saves them when reporting
+    cache = None
+    if args.root_folder is not None and (args.report is not None or os.path.exists(os.path.join(args.root_folder, STATE_FOLDER, METADATA_CACHE_NAME))):
+        cache = MetadataCache(args.root_folder)
+
+    if args.report is not None:
+        report_video_durations(collect_video_durations(args.root_folder, args.workers, cache, file_records), args.report, args.json)
+        return
+
+    if args.max_duration is None:
+        parser.error("a maximum duration is required, for example -d 4")
+
+    if not args.json:
+        print(f"Searching for videos with the length of {args.max_duration} seconds or less...\n")
+
+    matches = delete_short_videos(args.root_folder, args.max_duration, min_duration=args.min_duration, workers=args.workers,
+                                  dry_run=args.dry_run, print_output=not args.json, cache=cache, file_records=file_records)
+
+    if args.json:
+        videos = [{"path": file_path, "duration": duration, "deleted": not args.dry_run} for file_path, duration in matches]
+        print(json.dumps(videos, indent=2))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()